@@ -155,3 +155,776 @@ try:
         raise ValueError("Simulated exception during file operations.")
 except Exception as e:
     print(f"Handled exception: {e}")
+
+# ## 4. Validating Many Values Without Raising Exceptions
+
+# Exceptions are the right tool when an error is *exceptional*: `check_age(150)` should raise.
+# But when we validate a huge batch where many values are wrong, raising is expensive:
+# each error creates an exception object, a traceback, and unwinds the stack to the `except` block.
+# With a high error rate, most of the time is spent building exceptions that we immediately catch.
+
+# For batches we can instead **return the errors as data**: a result object that lists which items failed and why.
+# `check_age` and `InvalidAgeError` stay as they are for single values.
+
+# ### Example: `validate_ages`
+
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional: lists are validated in pure Python
+    np = None
+
+AGE_ERROR_MESSAGE = "Age must be between 0 and 120"
+
+# One record per invalid item
+AgeError = namedtuple("AgeError", ["index", "age", "message"])
+
+class AgeValidation:
+    def __init__(self, ages, invalid_indices, messages=None):
+        self.ages = ages
+        self.invalid_indices = invalid_indices  # list, or NumPy array for array input
+        self.messages = messages or {}          # index -> message, only for non-default messages
+
+    @property
+    def ok(self):
+        return len(self.invalid_indices) == 0
+
+    # The records are only built when somebody asks for them
+    @property
+    def errors(self):
+        return [AgeError(int(i), self.ages[i], self.messages.get(i, AGE_ERROR_MESSAGE))
+                for i in self.invalid_indices]
+
+    def valid_ages(self):
+        if np is not None and isinstance(self.ages, np.ndarray):
+            return np.delete(self.ages, self.invalid_indices)
+        invalid = set(self.invalid_indices)
+        return [age for i, age in enumerate(self.ages) if i not in invalid]
+
+    # Turn the first error back into an exception, for code that prefers the exception style
+    def raise_first(self):
+        if not self.ok:
+            i = self.invalid_indices[0]
+            raise InvalidAgeError(self.ages[i], self.messages.get(i, AGE_ERROR_MESSAGE))
+
+    def __repr__(self):
+        return f"AgeValidation({len(self.ages)} ages, {len(self.invalid_indices)} invalid)"
+
+def validate_ages(ages):
+    # NumPy path: one vectorized comparison for the whole array
+    if np is not None and isinstance(ages, np.ndarray):
+        if ages.dtype.kind not in "biuf":
+            raise TypeError(f"Ages must be numeric, got an array of {ages.dtype}")
+        if ages.ndim != 1:  # The indices must point into `ages`: flatnonzero would give flat indices
+            raise ValueError(f"Ages must be a 1-D array, got {ages.ndim} dimensions")
+        return AgeValidation(ages, np.flatnonzero((ages < 0) | (ages > 120)))
+
+    # A generator can only be read once, and the result needs `len` and indexing: make it a list first
+    if not isinstance(ages, (list, tuple)):
+        ages = list(ages)
+
+    # Pure Python path: same rule as check_age, without creating any exception
+    try:
+        invalid = [i for i, age in enumerate(ages) if age < 0 or age > 120]
+        return AgeValidation(ages, invalid)
+    except TypeError:
+        pass
+    # Rare case: some values are not numbers. Check item by item and record the reason.
+    invalid, messages = [], {}
+    for i, age in enumerate(ages):
+        try:
+            if age < 0 or age > 120:
+                invalid.append(i)
+        except TypeError:
+            invalid.append(i)
+            messages[i] = "Age must be a number"
+    return AgeValidation(ages, invalid, messages)
+
+result = validate_ages([25, -3, 150, 40, "thirty"])
+print(result)  # Output: AgeValidation(5 ages, 3 invalid)
+for error in result.errors:
+    print(error)
+# Output:
+# AgeError(index=1, age=-3, message='Age must be between 0 and 120')
+# AgeError(index=2, age=150, message='Age must be between 0 and 120')
+# AgeError(index=4, age='thirty', message='Age must be a number')
+print(result.valid_ages())  # Output: [25, 40]
+
+try:
+    result.raise_first()
+except InvalidAgeError as e:
+    print(e)  # Output: -3 -> Age must be between 0 and 120
+
+# ### Benchmark: high error rates
+
+# We validate 1,000,000 ages with different error rates, comparing:
+# - calling `check_age` in a loop and catching `InvalidAgeError`
+# - `validate_ages` on a list
+# - `validate_ages` on a NumPy array
+
+import random
+import time
+
+N_AGES = 1_000_000
+
+def validate_with_exceptions(ages):
+    invalid = []
+    for i, age in enumerate(ages):
+        try:
+            check_age(age)
+        except InvalidAgeError:
+            invalid.append(i)
+    return invalid
+
+for error_rate in [0.0, 0.1, 0.5, 0.9]:
+    ages = [random.randint(121, 200) if random.random() < error_rate else random.randint(0, 120)
+            for _ in range(N_AGES)]
+    ages_array = np.array(ages)
+
+    start = time.perf_counter()
+    expected = validate_with_exceptions(ages)
+    with_exceptions = time.perf_counter() - start
+
+    start = time.perf_counter()
+    from_list = validate_ages(ages)
+    list_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    from_array = validate_ages(ages_array)
+    array_time = time.perf_counter() - start
+
+    assert from_list.invalid_indices == expected
+    assert from_array.invalid_indices.tolist() == expected
+    print(f"{error_rate:4.0%} errors: exceptions {with_exceptions:.3f} s | "
+          f"list {list_time:.3f} s | NumPy {array_time * 1e3:.1f} ms")
+
+# Typical results: with 0% errors the list version is already ~2x faster than the try/except loop
+# (no call to check_age, no f-string for valid ages), and with 90% errors it is ~13x faster.
+# The NumPy version takes a few milliseconds whatever the error rate.
+
+# ## 5. Writing to Many Files at Once
+
+# `MultiFileHandler` works for two files, but it does not scale well:
+# - the number of files is fixed
+# - every line is formatted and written separately to each file
+
+# `FanOutWriter` generalizes it to any number of files and keeps the same guarantees:
+# - **all or nothing when opening**: if one file cannot be opened, the ones already opened are closed
+#   and the exception is re-raised
+# - **every file is closed on exit**, even if the `with` block or closing another file fails,
+#   and the exception from the `with` block is propagated
+
+# To make it fast:
+# - every file receives the same lines, so each line is encoded to bytes **once** and kept in a shared buffer
+# - when the buffer is full (by default 1 MB), one block is built per file with a single `join`
+#   and written with a single call, instead of one small write per line per file
+# - optionally, blocks are written with `os.writev`, which sends a list of chunks (prefix, lines, final newline)
+#   to the operating system in one call, without concatenating them first
+# - optionally, background threads write the blocks while the main thread keeps producing lines
+# - optionally, each file is gzip-compressed
+
+# ### Example: `FanOutWriter`
+
+import gzip
+import os
+import queue
+import threading
+
+class FanOutWriter:
+    def __init__(self, file_names, line_prefix=None, buffer_size=1 << 20, compression=None,
+                 use_writev=False, background_threads=0, encoding="utf-8"):
+        if compression not in (None, "gzip"):
+            raise ValueError(f"Unsupported compression: {compression!r}")
+        if use_writev and (compression or not hasattr(os, "writev")):
+            raise ValueError("os.writev needs uncompressed files on a POSIX system")
+        self.file_names = list(file_names)
+        # e.g. "File {number}: " writes the same lines as MultiFileHandler
+        self.prefixes = [line_prefix.format(number=n).encode(encoding) if line_prefix else b""
+                         for n in range(1, len(self.file_names) + 1)]
+        self.buffer_size = buffer_size
+        self.compression = compression
+        self.use_writev = use_writev
+        self.background_threads = background_threads
+        self.encoding = encoding
+        self.files = []
+        self._lines = []  # Encoded lines waiting to be written, shared by all files
+        self._size = 0
+        self._queues = []
+        self._threads = []
+        self._error = None
+
+    def _open(self, name):
+        if self.compression == "gzip":
+            return gzip.open(name, "wb", compresslevel=6)  # Level 9 (the default) is much slower for little gain
+        # No Python-level buffering: FanOutWriter keeps its own buffer
+        return open(name, "wb", buffering=0)
+
+    def __enter__(self):
+        try:
+            for name in self.file_names:
+                self.files.append(self._open(name))
+        except Exception:
+            # If any file fails to open, we release the files already opened
+            for file in self.files:
+                file.close()
+            self.files = []
+            raise
+        for _ in range(self.background_threads):
+            tasks = queue.Queue(maxsize=64)
+            thread = threading.Thread(target=self._worker, args=(tasks,), daemon=True)
+            thread.start()
+            self._queues.append(tasks)
+            self._threads.append(thread)
+        return self
+
+    def write(self, text):
+        line = text.encode(self.encoding)
+        self._lines.append(line)
+        self._size += len(line) + 1
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def write_lines(self, lines):
+        encoded = [line.encode(self.encoding) for line in lines]
+        self._lines.extend(encoded)
+        self._size += sum(map(len, encoded)) + len(encoded)
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._error is not None:
+            raise self._error
+        lines = self._lines
+        if not lines:
+            return
+        self._lines = []
+        self._size = 0
+        shared = b"\n".join(lines)  # Reused by every file without a prefix
+        for i, prefix in enumerate(self.prefixes):
+            chunks = [prefix, (b"\n" + prefix).join(lines), b"\n"] if prefix else [shared, b"\n"]
+            if self._queues:
+                # A file always goes to the same thread, so its blocks are written in order
+                self._queues[i % len(self._queues)].put((i, chunks))
+            else:
+                self._write_chunks(i, chunks)
+
+    def _write_chunks(self, i, chunks):
+        if not self.use_writev:
+            file, data = self.files[i], b"".join(chunks)
+            if self.compression:
+                file.write(data)  # GzipFile always writes (and compresses) everything
+                return
+            # Unbuffered files are raw FileIO objects: like os.write, `write` may write less than asked
+            rest = memoryview(data)
+            while rest:
+                rest = rest[file.write(rest):]
+            return
+        fd = self.files[i].fileno()
+        written = os.writev(fd, chunks)
+        if written < sum(map(len, chunks)):  # The operating system may write less than asked
+            rest = b"".join(chunks)[written:]
+            while rest:
+                rest = rest[os.write(fd, rest):]
+
+    def _worker(self, tasks):
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            if self._error is None:
+                try:
+                    self._write_chunks(*task)
+                except BaseException as e:
+                    self._error = e  # Re-raised in the main thread by the next flush or on exit
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        errors = []
+        try:
+            self.flush()
+        except BaseException as e:
+            errors.append(e)
+        for tasks in self._queues:
+            tasks.put(None)
+        for thread in self._threads:
+            thread.join()
+        if self._error is not None and self._error not in errors:
+            errors.append(self._error)
+        # Ensure every file is closed, even if closing one of them fails
+        for file in self.files:
+            try:
+                file.close()
+            except BaseException as e:
+                errors.append(e)
+        self.files, self._queues, self._threads = [], [], []
+        if exc_type is None and errors:
+            raise errors[0]
+        return False  # Propagate the exception from the `with` block, if any
+
+# Same content as MultiFileHandler, but for any number of files
+names = [f"fanout_{n}.txt" for n in range(1, 4)]
+with FanOutWriter(names, line_prefix="File {number}: ") as writer:
+    writer.write("This is some test content.")
+    writer.write_lines(["Writing more content.", "And one more line."])
+with open("fanout_3.txt") as f:
+    print(f.read())
+# Output:
+# File 3: This is some test content.
+# File 3: Writing more content.
+# File 3: And one more line.
+
+# All or nothing: the third file cannot be opened, so the first two are closed again
+try:
+    with FanOutWriter(["fanout_1.txt", "fanout_2.txt", "missing_folder/fanout_3.txt"]) as writer:
+        writer.write("never written")
+except FileNotFoundError as e:
+    print(f"Handled exception: {e}")
+# Output: Handled exception: [Errno 2] No such file or directory: 'missing_folder/fanout_3.txt'
+
+# An exception inside the `with` block is propagated after the buffered lines are written and every file is closed
+try:
+    with FanOutWriter(names, line_prefix="File {number}: ") as writer:
+        writer.write("Written before the error.")
+        raise ValueError("Simulated exception during file operations.")
+except ValueError as e:
+    print(f"Handled exception: {e}, file closed: {writer.files == []}")
+# Output: Handled exception: Simulated exception during file operations., file closed: True
+
+# ### Benchmark: writing to 100 files
+
+# Each file gets the same 50,000 lines. The baseline is the MultiFileHandler approach extended to 100 files:
+# text files with default buffering, and each line formatted and written separately to each file.
+
+import shutil
+import tempfile
+import time
+
+N_FILES = 100
+N_LINES = 50_000
+lines = [f"record {i}: temperature={20 + i % 15} status=ok" for i in range(N_LINES)]
+bench_dir = tempfile.mkdtemp()
+bench_names = [os.path.join(bench_dir, f"out_{n:03}.txt") for n in range(1, N_FILES + 1)]
+
+def naive_fan_out():
+    files = [open(name, "w") for name in bench_names]
+    try:
+        for line in lines:
+            for n, file in enumerate(files, start=1):
+                file.write(f"File {n}: {line}\n")
+    finally:
+        for file in files:
+            file.close()
+
+def fan_out(batch, **options):
+    names = bench_names if not options.get("compression") else [name + ".gz" for name in bench_names]
+    with FanOutWriter(names, line_prefix="File {number}: ", **options) as writer:
+        if batch:
+            for start in range(0, N_LINES, 10_000):
+                writer.write_lines(lines[start:start + 10_000])
+        else:
+            for line in lines:
+                writer.write(line)
+
+def timed(label, func):
+    start = time.perf_counter()
+    func()
+    print(f"{label:44} {time.perf_counter() - start:.2f} s")
+
+timed("naive (one write per line per file)", naive_fan_out)
+with open(bench_names[0], "rb") as f:
+    expected = f.read()
+timed("FanOutWriter.write", lambda: fan_out(False))
+timed("FanOutWriter.write + os.writev", lambda: fan_out(False, use_writev=True))
+timed("FanOutWriter.write + 4 threads", lambda: fan_out(False, background_threads=4))
+timed("FanOutWriter.write_lines", lambda: fan_out(True))
+timed("FanOutWriter.write_lines + gzip", lambda: fan_out(True, compression="gzip"))
+timed("FanOutWriter.write_lines + gzip + 4 threads",
+      lambda: fan_out(True, compression="gzip", background_threads=4))
+
+# The output is byte-for-byte the same as the naive version
+with open(bench_names[0], "rb") as f:
+    assert f.read() == expected
+with gzip.open(bench_names[0] + ".gz", "rb") as f:
+    assert f.read() == expected
+shutil.rmtree(bench_dir)
+
+# Typical results (1 CPU):
+# - naive: ~1.2 s; FanOutWriter: ~0.3 s (about 4x faster), with `write` or `write_lines`
+# - `os.writev` and background threads make little difference here: after buffering, there are only
+#   a few large writes per file. Threads help when the disk is slow or with several CPUs (gzip releases the GIL).
+# - gzip costs CPU time: use it when disk space or I/O bandwidth is the bottleneck
+
+# ## 6. Reusing Resources with a Pool
+
+# `CustomResource` acquires a resource in `__enter__` and releases it in `__exit__`, on every `with` block.
+# This is fine when acquiring is cheap. When it is expensive (opening a database connection,
+# starting a worker session, opening a file on a network drive), we pay that price again and again.
+
+# A **pool** keeps resources alive between `with` blocks:
+# - the pool calls the resource's own `__enter__` once, when the resource is created,
+#   and its `__exit__` once, when the resource is finally closed
+# - `with pool.acquire() as resource:` borrows a resource and gives it back at the end of the block
+# - **min/max size**: the pool keeps at least `min_size` resources and never creates more than `max_size`;
+#   when all of them are in use, callers wait (optionally with a timeout)
+# - **health checks**: a borrowed resource is checked first and replaced if it is broken
+# - **idle eviction**: resources unused for more than `max_idle` seconds are closed (down to `min_size`)
+# - **async support**: `async with pool.acquire()` waits without blocking the event loop
+# - **metrics**: how long callers waited to get a resource
+
+# ### Example: `ResourcePool`
+
+import asyncio
+import collections
+import statistics
+
+class PooledEntry:
+    __slots__ = ("manager", "resource", "last_used")
+
+    def __init__(self, manager, resource):
+        self.manager = manager    # The object with __enter__/__exit__ (e.g. a CustomResource)
+        self.resource = resource  # What its __enter__ returned
+        self.last_used = time.monotonic()
+
+class PoolLease:
+    def __init__(self, pool, timeout):
+        self.pool = pool
+        self.timeout = timeout
+        self.entry = None
+
+    def __enter__(self):
+        self.entry = self.pool._checkout(self.timeout)
+        return self.entry.resource
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.pool._checkin(self.entry)
+        self.entry = None
+        return False  # Exceptions from the `with` block are propagated
+
+    async def __aenter__(self):
+        self.entry = await self.pool._checkout_async(self.timeout)
+        return self.entry.resource
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        return self.__exit__(exc_type, exc_value, traceback)
+
+class ResourcePool:
+    def __init__(self, factory, min_size=0, max_size=10, health_check=None, max_idle=None, timeout=None):
+        if not 0 <= min_size <= max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size")
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.health_check = health_check
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._idle = collections.deque()
+        self._size = 0  # Resources created and not closed: idle + in use
+        self._closed = False
+        self._condition = threading.Condition()
+        self._async_waiters = collections.deque()  # (event loop, future) of the tasks waiting for a resource
+        self._wait_times = collections.deque(maxlen=10_000)  # Most recent acquisition wait times
+        self.counters = collections.Counter()
+        for _ in range(min_size):
+            self._size += 1
+            self._idle.append(self._create())
+
+    def _create(self):
+        try:
+            manager = self.factory()
+            entry = PooledEntry(manager, manager.__enter__())
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._notify()
+            raise
+        with self._condition:
+            self.counters["created"] += 1
+        return entry
+
+    def _destroy(self, entry):
+        with self._condition:
+            self._size -= 1
+            self.counters["destroyed"] += 1
+            self._notify()
+        entry.manager.__exit__(None, None, None)
+
+    # Called with the lock held. Idle resources are lent most recently used first (from the right),
+    # so the oldest ones stay on the left and are the first to expire.
+    def _pop_expired(self):
+        expired = []
+        if self.max_idle is not None:
+            limit = time.monotonic() - self.max_idle
+            while self._idle and self._idle[0].last_used < limit and self._size - len(expired) > self.min_size:
+                expired.append(self._idle.popleft())
+        return expired
+
+    # Called with the lock held. Returns (idle entry, whether to create one, expired entries to destroy);
+    # when there is nothing to take, create or destroy, the caller has to wait.
+    def _reserve(self):
+        if self._closed:
+            raise RuntimeError("The pool is closed")
+        expired = self._pop_expired()
+        entry = self._idle.pop() if self._idle else None
+        create = entry is None and not expired and self._size < self.max_size
+        if create:
+            self._size += 1  # Reserve the slot before creating outside the lock
+        return entry, create, expired
+
+    # Called with the lock held: wake one waiting thread and one waiting task
+    def _notify(self):
+        self._condition.notify()
+        while self._async_waiters:
+            loop, waiter = self._async_waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(self._wake, waiter)
+                return
+            except RuntimeError:
+                pass  # Its event loop is closed: wake the next one
+
+    @staticmethod
+    def _wake(waiter):
+        if not waiter.done():
+            waiter.set_result(None)
+
+    def _checkout(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        start = time.perf_counter()
+        deadline = None if timeout is None else start + timeout
+        while True:
+            with self._condition:
+                while True:
+                    entry, create, expired = self._reserve()
+                    if entry is not None or create or expired:
+                        break
+                    remaining = None if deadline is None else deadline - time.perf_counter()
+                    if remaining is not None and remaining <= 0:
+                        self.counters["timeouts"] += 1
+                        raise TimeoutError(f"No resource available after {timeout} s")
+                    self._condition.wait(remaining)
+            for old in expired:
+                self._destroy(old)
+            if create:
+                entry = self._create()
+            elif entry is None or not self._is_healthy(entry):
+                continue
+            self._record_wait(time.perf_counter() - start)
+            return entry
+
+    # Same as _checkout, but a task waits on a future, so neither the event loop nor a thread is blocked.
+    # Only creating and closing resources, which may block, run in worker threads.
+    async def _checkout_async(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        start = time.perf_counter()
+        deadline = None if timeout is None else start + timeout
+        loop = asyncio.get_running_loop()
+        while True:
+            waiter = None
+            with self._condition:
+                entry, create, expired = self._reserve()
+                if entry is None and not create and not expired:
+                    waiter = loop.create_future()
+                    self._async_waiters.append((loop, waiter))
+            if waiter is not None:
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                try:
+                    await asyncio.wait_for(waiter, remaining)
+                except asyncio.TimeoutError:
+                    self._forget_waiter(loop, waiter)
+                    with self._condition:
+                        self.counters["timeouts"] += 1
+                    raise TimeoutError(f"No resource available after {timeout} s") from None
+                except asyncio.CancelledError:
+                    self._forget_waiter(loop, waiter)
+                    raise
+                continue
+            for old in expired:
+                await asyncio.to_thread(self._destroy, old)
+            if create:
+                creating = asyncio.ensure_future(asyncio.to_thread(self._create))
+                try:
+                    entry = await asyncio.shield(creating)
+                except asyncio.CancelledError:
+                    # The thread cannot be stopped: give its resource back to the pool when it is created
+                    creating.add_done_callback(self._checkin_abandoned)
+                    raise
+            elif entry is None or not self._is_healthy(entry):
+                continue
+            self._record_wait(time.perf_counter() - start)
+            return entry
+
+    # A task that stops waiting (timeout or cancellation) may already have been woken: pass the wake-up on
+    def _forget_waiter(self, loop, waiter):
+        with self._condition:
+            try:
+                self._async_waiters.remove((loop, waiter))
+            except ValueError:
+                self._notify()
+
+    def _checkin_abandoned(self, creating):
+        if not creating.cancelled() and creating.exception() is None:
+            self._checkin(creating.result())
+
+    def _is_healthy(self, entry):
+        if self.health_check is None:
+            return True
+        try:
+            healthy = self.health_check(entry.resource)
+        except Exception:
+            healthy = False
+        if not healthy:
+            with self._condition:
+                self.counters["failed_health_checks"] += 1
+            self._destroy(entry)
+        return healthy
+
+    def _checkin(self, entry):
+        with self._condition:
+            if not self._closed:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+                self._notify()
+                return
+        self._destroy(entry)
+
+    def _record_wait(self, seconds):
+        with self._condition:
+            self.counters["acquisitions"] += 1
+            self._wait_times.append(seconds)
+
+    def acquire(self, timeout=None):
+        return PoolLease(self, timeout)
+
+    # Close idle resources that have not been used for `max_idle` seconds (down to `min_size`)
+    def evict_idle(self):
+        with self._condition:
+            expired = self._pop_expired()
+        for old in expired:
+            self._destroy(old)
+        return len(expired)
+
+    def wait_stats(self):
+        waits = sorted(self._wait_times)
+        if not waits:
+            return {"count": 0}
+        return {
+            "count": len(waits),
+            "mean_ms": round(statistics.fmean(waits) * 1e3, 3),
+            "p99_ms": round(waits[int(0.99 * (len(waits) - 1))] * 1e3, 3),
+            "max_ms": round(waits[-1] * 1e3, 3),
+        }
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            idle, self._idle = list(self._idle), collections.deque()
+            self._condition.notify_all()
+            while self._async_waiters:
+                self._notify()  # Every waiting task wakes up and sees that the pool is closed
+        for entry in idle:
+            self._destroy(entry)  # Resources still in use are closed when they are given back
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+# Borrowing a CustomResource three times: it is acquired once and released when the pool is closed
+with ResourcePool(CustomResource, max_size=1) as pool:
+    for _ in range(3):
+        with pool.acquire() as resource:
+            resource.do_something()
+# Output:
+# Resource acquired.
+# Resource is being used.
+# Resource is being used.
+# Resource is being used.
+# Resource released.
+
+# ### Example: A pool of database connections
+
+# A resource class that follows the same protocol as CustomResource:
+# `__enter__` opens a connection and returns it, `__exit__` closes it.
+import sqlite3
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "pool_demo.db")
+
+class DatabaseConnection:
+    def __enter__(self):
+        self.connection = sqlite3.connect(DB_PATH, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS visits (page TEXT)")
+        return self.connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.connection.close()
+        return False
+
+def connection_is_alive(connection):
+    connection.execute("SELECT 1")
+    return True
+
+def count_visits(connection):
+    return connection.execute("SELECT COUNT(*) FROM visits").fetchone()[0]
+
+# ### Benchmark: a new connection per `with` block vs a pool
+
+N_QUERIES = 5_000
+
+start = time.perf_counter()
+for _ in range(N_QUERIES):
+    with DatabaseConnection() as connection:
+        count_visits(connection)
+without_pool = time.perf_counter() - start
+
+db_pool = ResourcePool(DatabaseConnection, min_size=1, max_size=4, health_check=connection_is_alive, max_idle=30)
+start = time.perf_counter()
+for _ in range(N_QUERIES):
+    with db_pool.acquire() as connection:
+        count_visits(connection)
+with_pool = time.perf_counter() - start
+print(f"New connection every time: {without_pool:.2f} s")
+print(f"Pooled connections:        {with_pool:.2f} s ({without_pool / with_pool:.0f}x faster)")
+print(dict(db_pool.counters))  # Output: {'created': 1, 'acquisitions': 5000}
+
+# A broken connection is detected by the health check and replaced
+with db_pool.acquire() as connection:
+    connection.close()
+with db_pool.acquire() as connection:
+    print(count_visits(connection))  # Output: 0
+print(db_pool.counters["failed_health_checks"])  # Output: 1
+
+# ### Example: Waiting for a resource, with threads and with asyncio
+
+# 16 threads share 4 connections: the wait-time metrics show how long they queued.
+def worker(_):
+    with db_pool.acquire(timeout=5) as connection:
+        count_visits(connection)
+        time.sleep(0.005)  # Simulate some work while holding the connection
+
+from concurrent.futures import ThreadPoolExecutor
+
+with ThreadPoolExecutor(max_workers=16) as executor:
+    list(executor.map(worker, range(400)))
+print(db_pool.wait_stats())
+# Output (example): {'count': 5402, 'mean_ms': 1.139, 'p99_ms': 0.122, 'max_ms': 515.624}
+# (the statistics include the 5,000 uncontended acquisitions of the benchmark above)
+
+# The same pool with asyncio: 50 tasks, `async with` does not block the event loop while waiting
+async def handle_request(i):
+    async with db_pool.acquire() as connection:
+        await asyncio.sleep(0.01)
+        return count_visits(connection)
+
+async def main():
+    return await asyncio.gather(*(handle_request(i) for i in range(50)))
+
+print(len(asyncio.run(main())))  # Output: 50
+
+# Idle eviction: connections unused for more than max_idle seconds are closed, down to min_size
+db_pool.max_idle = 0
+print(db_pool.evict_idle())  # Output: 3 (4 connections were open, min_size is 1)
+db_pool.close()
+
+# Typical results: a pooled connection is ~15x faster than opening a new one for every `with` block.
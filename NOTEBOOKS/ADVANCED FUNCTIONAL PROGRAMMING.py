@@ -139,3 +139,1032 @@ product = reduce(lambda x, y: x * y, numbers)
 print(product)  # Output: 120
 
 # Lambda functions are particularly useful for writing small functions in-line, making the code more concise and readable.
+
+# ## 4. A Low-Overhead Profiling Decorator
+
+# `timer_decorator` is a nice first example, but it has three problems when used on real code:
+# - it prints on every call, which is slow and floods the output for functions called millions of times
+# - `time.time()` is the wall clock: it has a low resolution and can jump when the system clock changes
+# - the wrapper hides the original function's name and docstring, because it does not use `functools.wraps`
+
+# The `profiled` decorator below fixes these:
+# - it uses `time.perf_counter_ns()`, a high-resolution clock that always moves forward, and works with integers
+# - it keeps statistics in memory (number of calls, total time, a histogram for percentiles) and prints nothing
+# - it can time only a sample of the calls, to make the cost even lower on very hot functions
+# - it separates the time spent in the function itself ("self time") from the time spent in profiled functions it calls
+# - each thread writes to its own statistics, so threads never wait for each other, and processes can send
+#   their statistics back to the parent to be merged
+
+# ### Example: The `profiled` decorator
+
+import functools
+import itertools
+import os
+import threading
+
+# A histogram with 8 buckets for every power of two, so percentiles are accurate to about 12%
+class FunctionStats:
+    def __init__(self, sample_every=1):
+        self.sample_every = sample_every  # Only 1 call in `sample_every` is timed
+        self.count = 0
+        self.total_ns = 0
+        self.self_ns = 0
+        self.buckets = {}
+
+    @staticmethod
+    def bucket(ns):
+        if ns < 16:
+            return ns
+        shift = ns.bit_length() - 4
+        return shift * 8 + (ns >> shift)
+
+    @staticmethod
+    def bucket_value(index):
+        if index < 16:
+            return index
+        shift, top = divmod(index - 8, 8)
+        return (top + 8) << shift
+
+    def add(self, elapsed_ns, self_ns):
+        self.count += 1
+        self.total_ns += elapsed_ns
+        self.self_ns += self_ns
+        if elapsed_ns < 16:
+            index = elapsed_ns
+        else:  # Same as self.bucket(elapsed_ns), inlined because this runs on every timed call
+            shift = elapsed_ns.bit_length() - 4
+            index = shift * 8 + (elapsed_ns >> shift)
+        buckets = self.buckets
+        buckets[index] = buckets.get(index, 0) + 1
+
+    def merge(self, other):
+        self.sample_every = other.sample_every
+        self.count += other.count
+        self.total_ns += other.total_ns
+        self.self_ns += other.self_ns
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def percentile(self, q):
+        target = q * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= target:
+                return self.bucket_value(index)
+        return 0
+
+    def to_dict(self):
+        return {'sample_every': self.sample_every, 'count': self.count, 'total_ns': self.total_ns,
+                'self_ns': self.self_ns, 'buckets': {str(i): c for i, c in self.buckets.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls(data['sample_every'])
+        stats.count, stats.total_ns, stats.self_ns = data['count'], data['total_ns'], data['self_ns']
+        stats.buckets = {int(i): c for i, c in data['buckets'].items()}
+        return stats
+
+_all_thread_stats = []      # One (lock, dictionary) per thread: function name -> FunctionStats
+_imported_stats = {}        # Statistics sent back by other processes
+_stats_lock = threading.Lock()
+
+class _ThreadState(threading.local):
+    # Runs once in every thread, the first time the thread uses `_thread_state`
+    def __init__(self):
+        self.stats = {}
+        self.stack = []  # Time spent in profiled children, for each profiled call in progress
+        # Only taken by this thread and by collect_stats/reset_stats, so it is almost never contended
+        self.lock = threading.Lock()
+        with _stats_lock:
+            _all_thread_stats.append((self.lock, self.stats))
+
+_thread_state = _ThreadState()
+
+def profiled(func=None, *, sample_rate=1.0):
+    if func is None:  # Used as @profiled(sample_rate=...)
+        return functools.partial(profiled, sample_rate=sample_rate)
+
+    name = f"{func.__module__}.{func.__qualname__}"
+    sample_every = max(1, round(1 / sample_rate))
+    calls = itertools.count()
+    clock = time.perf_counter_ns
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if sample_every > 1 and next(calls) % sample_every:
+            return func(*args, **kwargs)  # Not sampled: no timing at all
+        state = _thread_state
+        stats = state.stats.get(name)
+        if stats is None:
+            with state.lock:
+                stats = state.stats[name] = FunctionStats(sample_every)
+        stack = state.stack
+        stack.append(0)
+        start = clock()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = clock() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed  # Tell the caller how long we took
+            with state.lock:  # collect_stats may be reading these statistics from another thread
+                stats.add(elapsed, elapsed - children)
+
+    return wrapper
+
+# ### Reporting and exporting
+
+# Merge the statistics of all threads (and of the processes we imported)
+def collect_stats():
+    merged = {}
+    with _stats_lock:
+        thread_stats = list(_all_thread_stats)
+        for name, stats in _imported_stats.items():
+            merged.setdefault(name, FunctionStats()).merge(stats)
+    for lock, stats_by_name in thread_stats:
+        with lock:  # The thread cannot add a call while we copy its statistics
+            for name, stats in stats_by_name.items():
+                merged.setdefault(name, FunctionStats()).merge(stats)
+    return merged
+
+# Statistics as plain data (JSON-compatible), e.g. to return them from a worker process
+def export_stats(reset=False):
+    exported = {name: stats.to_dict() for name, stats in collect_stats().items()}
+    if reset:
+        reset_stats()
+    return exported
+
+def import_stats(exported):
+    with _stats_lock:
+        for name, data in exported.items():
+            _imported_stats.setdefault(name, FunctionStats()).merge(FunctionStats.from_dict(data))
+
+def reset_stats():
+    with _stats_lock:
+        for lock, stats in _all_thread_stats:
+            with lock:
+                stats.clear()
+        _imported_stats.clear()
+
+# A forked child process starts with a copy of the parent's statistics; start from zero instead.
+# Only the forking thread exists in the child, and the other threads may have held the locks: make new ones.
+def _reset_stats_after_fork():
+    global _stats_lock
+    _stats_lock = threading.Lock()
+    _imported_stats.clear()
+    state = _thread_state
+    state.lock = threading.Lock()
+    state.stats.clear()
+    _all_thread_stats[:] = [(state.lock, state.stats)]
+
+os.register_at_fork(after_in_child=_reset_stats_after_fork)
+
+def report():
+    print(f"{'function':45} {'calls':>10} {'total ms':>10} {'self ms':>10} {'p50 us':>9} {'p99 us':>9}")
+    for name, stats in sorted(collect_stats().items(), key=lambda item: -item[1].total_ns):
+        scale = stats.sample_every  # Estimate the totals when only a sample was timed
+        print(f"{name:45} {stats.count * scale:>10} {stats.total_ns * scale / 1e6:>10.2f} "
+              f"{stats.self_ns * scale / 1e6:>10.2f} {stats.percentile(0.5) / 1e3:>9.1f} {stats.percentile(0.99) / 1e3:>9.1f}")
+
+# ### Example: Nested calls and threads
+
+@profiled
+def parse_record(line):
+    return line.split(',')
+
+@profiled
+def load_records(lines):
+    """Parse every line of a CSV-like list."""
+    return [parse_record(line) for line in lines]
+
+print(load_records.__name__, '-', load_records.__doc__)  # Output: load_records - Parse every line of a CSV-like list.
+
+lines = [f"{i},name{i},{i * 2}" for i in range(1000)]
+threads = [threading.Thread(target=load_records, args=(lines,)) for _ in range(4)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+
+# `load_records` has a large total time but a small self time: most of it is spent in `parse_record`
+report()
+
+# ### Example: Collecting statistics from worker processes
+
+from concurrent.futures import ProcessPoolExecutor
+
+@profiled
+def heavy_task(n):
+    return sum(i * i for i in range(n))
+
+def run_task(n):
+    heavy_task(n)
+    return export_stats(reset=True)  # Send this process's statistics back to the parent
+
+if __name__ == '__main__':
+    reset_stats()
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        for exported in pool.map(run_task, [100_000] * 8):
+            import_stats(exported)
+    report()
+
+# ### Measuring the overhead
+
+# We time a function that does nothing, so that everything we measure is the cost of the decorator.
+
+import timeit
+
+def no_op():
+    pass
+
+@functools.wraps(no_op)
+def plain_wrapper():
+    return no_op()
+
+N_CALLS = 1_000_000
+baseline = min(timeit.repeat(no_op, number=N_CALLS, repeat=3))
+for label, func in [("wrapper without timing", plain_wrapper),
+                    ("profiled (every call)", profiled(no_op)),
+                    ("profiled (1% sampled)", profiled(sample_rate=0.01)(no_op))]:
+    elapsed = min(timeit.repeat(func, number=N_CALLS, repeat=3))
+    print(f"{label:25} overhead: {(elapsed - baseline) / N_CALLS * 1e9:4.0f} ns per call")
+
+# ## 5. Caching Results with a Decorator
+
+# Decorators are a natural place to add caching (also called memoization): the wrapper remembers the result
+# for each set of arguments and returns it directly the next time, without calling the function again.
+# Python has `functools.lru_cache`, but a cache for real applications usually needs a few more features:
+# - a limit on the number of entries (LRU: the Least Recently Used entry is removed first)
+# - a time to live (TTL): entries expire after some seconds, so the data does not get too old
+# - a limit on memory, weighing each entry by its size
+# - an optional on-disk tier (here SQLite), so results survive a restart and can be shared by several processes
+# - support for `async def` functions
+# - stampede protection: when many callers ask for the same missing key at the same time,
+#   the function runs once and the others wait for its result
+# - hit/miss statistics
+
+# ### Example: The `cached` decorator
+
+import asyncio
+import inspect
+import pickle
+import sqlite3
+import sys
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Results stored in an SQLite file, shared by all cached functions that use the same file
+class DiskTier:
+    def __init__(self, path, namespace):
+        self.namespace = namespace
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        # The namespace (the function's name) has its own column, so one function can be cleared without the others
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key BLOB NOT NULL,
+                value BLOB NOT NULL,
+                expires_at REAL,
+                PRIMARY KEY (namespace, key)
+            )
+        ''')
+
+    def get(self, key):
+        with self.lock:
+            row = self.connection.execute('SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?',
+                                          (self.namespace, pickle.dumps(key))).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return False, None
+        return True, pickle.loads(row[0])
+
+    def set(self, key, value, ttl):
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self.lock, self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) '
+                                    'VALUES (?, ?, ?, ?)',
+                                    (self.namespace, pickle.dumps(key), pickle.dumps(value), expires_at))
+
+    def clear(self):
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM cache_entries WHERE namespace = ?', (self.namespace,))
+
+_KWARGS_MARK = object()
+_RETRY = object()  # Given to async waiters when the caller computing the value was cancelled
+
+def cached(maxsize=128, ttl=None, max_bytes=None, sizeof=sys.getsizeof, disk_path=None):
+    def decorator(func):
+        entries = OrderedDict()  # key -> (value, expires_at, size); the oldest entry comes first
+        lock = threading.Lock()
+        waiting = {}             # key -> Future, for calls in progress
+        stats = {'hits': 0, 'misses': 0, 'disk_hits': 0, 'evictions': 0, 'bytes': 0}
+        disk = DiskTier(disk_path, f"{func.__module__}.{func.__qualname__}") if disk_path else None
+
+        def make_key(args, kwargs):
+            if kwargs:
+                return args + (_KWARGS_MARK,) + tuple(sorted(kwargs.items()))
+            return args
+
+        # Must be called with `lock` held
+        def lookup(key):
+            entry = entries.get(key)
+            if entry is None:
+                return False, None
+            value, expires_at, size = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del entries[key]
+                stats['bytes'] -= size
+                return False, None
+            entries.move_to_end(key)  # Now the most recently used
+            stats['hits'] += 1
+            return True, value
+
+        # Must be called with `lock` held
+        def store(key, value):
+            size = sizeof(value) if max_bytes is not None else 0
+            if key in entries:
+                stats['bytes'] -= entries.pop(key)[2]
+            expires_at = time.monotonic() + ttl if ttl is not None else None
+            entries[key] = (value, expires_at, size)
+            stats['bytes'] += size
+            while entries and (len(entries) > maxsize or (max_bytes is not None and stats['bytes'] > max_bytes)):
+                _, (_, _, evicted_size) = entries.popitem(last=False)
+                stats['bytes'] -= evicted_size
+                stats['evictions'] += 1
+
+        # Look in the disk tier, or call the function; returns the value to store
+        def load_from_disk(key):
+            if disk is not None:
+                found, value = disk.get(key)
+                if found:
+                    with lock:
+                        stats['disk_hits'] += 1
+                    return True, value
+            with lock:
+                stats['misses'] += 1
+            return False, None
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                key = make_key(args, kwargs)
+                while True:
+                    with lock:
+                        found, value = lookup(key)
+                        if found:
+                            return value
+                        future = waiting.get(key)
+                        is_leader = future is None
+                        if is_leader:
+                            future = waiting[key] = asyncio.get_running_loop().create_future()
+                    if is_leader:
+                        break
+                    # Someone is already computing it. `shield`: cancelling this caller must not cancel the others.
+                    value = await asyncio.shield(future)
+                    if value is not _RETRY:
+                        with lock:
+                            stats['hits'] += 1  # Same as the sync version: a value computed by someone else
+                        return value
+                    # The caller computing it was cancelled: try again, one of the waiters becomes the new leader
+                try:
+                    # sqlite blocks, so the disk tier is used from a worker thread, never from the event loop
+                    if disk is not None:
+                        found, value = await asyncio.to_thread(load_from_disk, key)
+                    else:
+                        found, value = load_from_disk(key)
+                    if not found:
+                        value = await func(*args, **kwargs)
+                        if disk is not None:
+                            await asyncio.to_thread(disk.set, key, value, ttl)
+                    with lock:
+                        store(key, value)
+                    future.set_result(value)
+                    return value
+                except asyncio.CancelledError:
+                    future.set_result(_RETRY)  # Only this caller is cancelled, not the ones waiting for it
+                    raise
+                except BaseException as e:
+                    future.set_exception(e)
+                    future.exception()  # Mark the exception as retrieved if nobody was waiting
+                    raise
+                finally:
+                    with lock:
+                        del waiting[key]
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                key = make_key(args, kwargs)
+                with lock:
+                    found, value = lookup(key)
+                    if found:
+                        return value
+                    future = waiting.get(key)
+                    is_leader = future is None
+                    if is_leader:
+                        future = waiting[key] = Future()
+                if not is_leader:
+                    # Someone is already computing it: wait for the value, or for the exception it raised
+                    value = future.result()
+                    with lock:
+                        stats['hits'] += 1
+                    return value
+                try:
+                    found, value = load_from_disk(key)
+                    if not found:
+                        value = func(*args, **kwargs)
+                        if disk is not None:
+                            disk.set(key, value, ttl)
+                    with lock:
+                        store(key, value)
+                    future.set_result(value)
+                    return value
+                except BaseException as e:
+                    future.set_exception(e)  # The waiters get the same exception instead of calling func again
+                    raise
+                finally:
+                    with lock:
+                        del waiting[key]
+
+        def cache_info():
+            with lock:
+                return dict(stats, size=len(entries))
+
+        def cache_clear(disk_too=False):
+            with lock:
+                entries.clear()
+                stats.update(hits=0, misses=0, disk_hits=0, evictions=0, bytes=0)
+            if disk_too and disk is not None:
+                disk.clear()
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
+
+# ### Example: LRU, TTL and statistics
+
+@cached(maxsize=2, ttl=0.5)
+def slow_square(x):
+    time.sleep(0.1)
+    return x * x
+
+slow_square(2)  # Miss: takes 0.1 s
+slow_square(2)  # Hit: instant
+slow_square(3)
+slow_square(4)  # The cache holds 2 entries, so 2 (the least recently used) is evicted
+print(slow_square.cache_info())  # Output: {'hits': 1, 'misses': 3, 'disk_hits': 0, 'evictions': 1, 'bytes': 0, 'size': 2}
+
+time.sleep(0.6)
+slow_square(4)  # The entry has expired, so this is a miss again
+print(slow_square.cache_info()['misses'])  # Output: 4
+
+# ### Example: Limiting memory
+
+# With `max_bytes`, each entry is weighed with `sys.getsizeof` (or your own `sizeof` function)
+@cached(maxsize=1000, max_bytes=10_000)
+def make_list(n):
+    return list(range(n))
+
+for n in range(200):
+    make_list(n)
+print(make_list.cache_info())  # Only the most recent lists fit in 10 KB
+
+# ### Example: Stampede protection
+
+calls = 0
+
+@cached()
+def fetch_report(report_id):
+    global calls
+    calls += 1
+    time.sleep(0.2)  # Simulate a slow database query
+    return f"report {report_id}"
+
+threads = [threading.Thread(target=fetch_report, args=(42,)) for _ in range(10)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+print(f"10 concurrent callers, function called {calls} time(s)")  # Output: 10 concurrent callers, function called 1 time(s)
+
+# ### Example: Async functions
+
+@cached(ttl=60)
+async def fetch_user(user_id):
+    await asyncio.sleep(0.2)  # Simulate a call to another service
+    return {'id': user_id, 'name': f"User {user_id}"}
+
+async def main():
+    results = await asyncio.gather(*(fetch_user(7) for _ in range(10)))
+    print(results[0], fetch_user.cache_info())
+
+asyncio.run(main())  # One miss and no duplicate calls, even with 10 concurrent coroutines
+
+# ### Example: The disk tier
+
+@cached(maxsize=100, disk_path='cache.db')
+def expensive_sum(n):
+    return sum(range(n))
+
+expensive_sum(10_000_000)
+expensive_sum.cache_clear()  # Empty the memory tier, as if the program had restarted
+expensive_sum(10_000_000)    # Found on disk
+print(expensive_sum.cache_info())  # Output: {'hits': 0, 'misses': 0, 'disk_hits': 1, ...}
+
+# ## 6. Lazy Pipelines with Generators
+
+# In section 3 each step builds a full list: `list(map(...))`, then `list(filter(...))` on that list, then `reduce`.
+# With millions of items, every intermediate list takes memory, and nothing can start until the previous step is done.
+
+# Generators let us chain the steps lazily instead: each item goes through the whole chain before the next one
+# is read, and no intermediate list is ever built. The `Stream` class below wraps this in a fluent API:
+# `Stream(source).map(f).filter(g).batch(n).reduce(h)`
+
+# - `map` and `filter` use the built-in `map` and `filter`, which are lazy iterators implemented in C,
+#   so chaining them costs no extra Python function calls
+# - `parallel_map` runs a slow function in a pool of threads or processes, with a limited number of items in flight
+# - everything is pulled from the end of the chain: the source is only read when a later step needs more items.
+#   This is natural backpressure: a slow consumer automatically slows down the producer, and `batch(n)` never
+#   holds more than `n` items
+
+# ### Example: The `Stream` class
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+
+_NO_INITIAL = object()
+
+class Stream:
+    def __init__(self, source):
+        self.iterable = source
+
+    def __iter__(self):
+        return iter(self.iterable)
+
+    def map(self, func):
+        return Stream(map(func, self.iterable))
+
+    def filter(self, predicate):
+        return Stream(filter(predicate, self.iterable))
+
+    def take(self, n):
+        return Stream(itertools.islice(self.iterable, n))
+
+    # Group items into lists of `size` (the last one may be shorter)
+    def batch(self, size):
+        iterator = iter(self.iterable)
+        return Stream(iter(lambda: list(itertools.islice(iterator, size)), []))
+
+    def flatten(self):
+        return Stream(itertools.chain.from_iterable(self.iterable))
+
+    # Apply `func` in a pool of workers, keeping at most `max_in_flight` items submitted at a time.
+    # Results come out in the same order as the input.
+    def parallel_map(self, func, workers=4, max_in_flight=None, processes=False):
+        max_in_flight = max_in_flight or workers * 2
+        executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+
+        def generate():
+            with executor_class(max_workers=workers) as executor:
+                in_flight = deque()
+                for item in self.iterable:
+                    if len(in_flight) >= max_in_flight:
+                        yield in_flight.popleft().result()  # Wait for the oldest before reading more input
+                    in_flight.append(executor.submit(func, item))
+                while in_flight:
+                    yield in_flight.popleft().result()
+
+        return Stream(generate())
+
+    # Terminal operations: they consume the stream
+
+    def reduce(self, func, initial=_NO_INITIAL):
+        if initial is _NO_INITIAL:
+            return reduce(func, self.iterable)
+        return reduce(func, self.iterable, initial)
+
+    def to_list(self):
+        return list(self.iterable)
+
+    def for_each(self, func):
+        for item in self.iterable:
+            func(item)
+
+# The square_generator and fibonacci_generator from section 2 work as sources
+print(Stream(square_generator(10)).filter(lambda x: x % 2 == 0).to_list())  # Output: [4, 16, 36, 64, 100]
+print(Stream(fibonacci_generator()).filter(lambda x: x % 2 == 0).take(5).to_list())  # Output: [0, 2, 8, 34, 144]
+print(Stream(range(1, 8)).batch(3).to_list())  # Output: [[1, 2, 3], [4, 5, 6], [7]]
+
+# Even though fibonacci_generator is infinite, only the items needed by `take(5)` are ever computed.
+
+# ### Example: A slow step in parallel
+
+def slow_lookup(x):
+    time.sleep(0.01)  # Simulate a network call
+    return x * 10
+
+start = time.perf_counter()
+result = Stream(range(100)).parallel_map(slow_lookup, workers=10).batch(25).map(sum).to_list()
+print(result, f"{time.perf_counter() - start:.2f} s")  # About 0.1 s instead of 1 s sequentially
+
+# ### Benchmark: Stream vs eager lists
+
+import tracemalloc
+
+def measure(label, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:10} result: {result}  time: {elapsed:.2f} s  peak memory: {peak / 1e6:.1f} MB")
+
+N_ITEMS = 1_000_000
+
+def eager():
+    squared = list(map(lambda x: x * x, range(N_ITEMS)))
+    evens = list(filter(lambda x: x % 2 == 0, squared))
+    return reduce(lambda x, y: x + y, evens)
+
+def lazy():
+    return Stream(range(N_ITEMS)).map(lambda x: x * x).filter(lambda x: x % 2 == 0).reduce(lambda x, y: x + y)
+
+measure("eager", eager)
+measure("Stream", lazy)
+
+# The Stream is a bit faster because it never allocates the big lists; the lambdas are called the same number of times.
+# More importantly, it never holds more than one item, so its memory use does not grow with N_ITEMS.
+
+# ## 7. Vectorized Numeric Pipelines with NumPy
+
+# `list(map(lambda x: x * x, numbers))` calls the lambda once per element: with 10 million numbers,
+# that is 10 million Python function calls. NumPy stores numbers in a compact array and applies an operation
+# to the whole array at once in C, which is typically 10 to 100 times faster.
+
+# Nice detail: the same lambdas work on a NumPy array. `(lambda x: x * x)(array)` squares every element,
+# and `(lambda x: x % 2 == 0)(array)` returns an array of True/False values that can be used as a mask.
+# The helpers below choose the path from the input, before calling the function, so it is never called twice:
+# the vectorized path for a numeric array, the pure Python path for anything else (or when NumPy is not installed).
+# For a function that does not work on arrays (e.g. it uses `if` on the value), pass `vectorized=False`.
+# A numeric array always gives back a NumPy array, whichever path is used; anything else gives a list.
+
+# Note: Python integers never overflow, but NumPy's 64-bit integers silently wrap around.
+# The product and sum helpers check for this; for `vmap`, make sure the results fit, or use a float array.
+# This is why a `range` stays on the Python path: it holds Python integers, and `x * x` must not wrap around.
+
+# ### Example: Vectorized helpers
+
+import math
+import operator
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Return `data` as a numeric NumPy array, or None if it is not array-like numeric data.
+# Lists and ranges are not converted: checking and converting every element costs about as much as the Python loop,
+# and their Python integers would become 64-bit integers that can wrap around.
+def as_numeric_array(data):
+    if np is None:
+        return None
+    if isinstance(data, np.ndarray) or hasattr(data, '__array__'):  # NumPy arrays, pandas Series, ...
+        array = np.asarray(data)
+    elif isinstance(data, (memoryview, bytes, bytearray)) or hasattr(data, 'typecode'):  # array.array
+        array = np.asarray(memoryview(data))
+    else:
+        return None
+    return array if array.dtype.kind in 'biuf' else None
+
+def vmap(func, data, vectorized=True):
+    array = as_numeric_array(data)
+    if array is None:
+        return list(map(func, data))
+    if not vectorized:
+        return np.array(list(map(func, array.tolist())))
+    result = func(array)
+    if not (isinstance(result, np.ndarray) and result.shape == array.shape):
+        raise TypeError("func must work element by element on an array; use vectorized=False")
+    return result
+
+def vfilter(predicate, data, vectorized=True):
+    array = as_numeric_array(data)
+    if array is None:
+        return list(filter(predicate, data))
+    if not vectorized:
+        return array[np.fromiter(map(predicate, array.tolist()), dtype=bool, count=len(array))]
+    mask = predicate(array)
+    if not (isinstance(mask, np.ndarray) and mask.dtype == bool and mask.shape == array.shape):
+        raise TypeError("predicate must return a boolean array; use vectorized=False")
+    return array[mask]
+
+# Product of all numbers, exact for integers even when the result does not fit in 64 bits
+def vproduct(data):
+    array = as_numeric_array(data)
+    if array is None:
+        return math.prod(data)
+    if array.dtype.kind == 'f':
+        return float(np.prod(array))  # Floats overflow to inf, like Python floats
+    if array.size == 0:
+        return 1
+    if not array.all():
+        return 0
+    # log2(|a * b * ...|) = log2|a| + log2|b| + ...: the number of bits of the result
+    bits = np.log2(np.abs(array.astype(np.float64))).sum()
+    if bits < 62:
+        return int(np.prod(array, dtype=np.int64))
+    return math.prod(array.tolist())  # Too big for int64: use Python's unlimited integers
+
+# Sum of all numbers, exact for integers
+def vtotal(data):
+    array = as_numeric_array(data)
+    if array is None:
+        return sum(data)
+    if array.dtype.kind == 'f':
+        return float(array.sum())
+    if np.abs(array.astype(np.float64)).sum() < 2 ** 62:
+        return int(array.sum(dtype=np.int64))
+    return sum(array.tolist())
+
+# `reduce` with a vectorized version for the common operators; any other function uses functools.reduce
+VECTORIZED_REDUCTIONS = {
+    operator.add: vtotal,
+    operator.mul: vproduct,
+    max: lambda array: array.max().item(),
+    min: lambda array: array.min().item(),
+}
+
+def vreduce(func, data):
+    array = as_numeric_array(data)
+    if array is not None and func in VECTORIZED_REDUCTIONS and array.size:
+        return VECTORIZED_REDUCTIONS[func](array)
+    return reduce(func, data)
+
+numbers_array = np.array([1, 2, 3, 4, 5])
+print(vmap(lambda x: x * x, numbers_array))              # Output: [ 1  4  9 16 25]
+print(vfilter(lambda x: x % 2 == 0, numbers_array))      # Output: [2 4]
+print(vreduce(operator.mul, numbers_array))              # Output: 120
+print(vmap(lambda x: x * x, [1, 2, 3]))                  # A list: pure Python path, Output: [1, 4, 9]
+print(vfilter(lambda x: x > 2 if x % 2 else False, numbers_array, vectorized=False))  # `if` on the value, Output: [3 5]
+print(vproduct(np.array([2 ** 40, 2 ** 40])))            # Output: 1208925819614629174706176 (exact, no wrap-around)
+print(np.prod(np.array([2 ** 40, 2 ** 40])))             # Output: 0 (NumPy alone wraps around)
+print(vmap(lambda x: x * x, range(2 ** 40, 2 ** 40 + 2))) # A range: pure Python path, Output: [1208925819614629174706176, 1208925819616828197961729]
+
+# ### Benchmark with 10 million elements
+
+N_NUMBERS = 10_000_000
+numbers_list = list(range(1, N_NUMBERS + 1))
+numbers_array = np.arange(1, N_NUMBERS + 1)
+factors_list = [2 if i % 1_000_000 == 0 else 1 for i in range(N_NUMBERS)]  # A product that fits in 64 bits
+factors_array = np.array(factors_list)
+
+def compare(label, python_func, numpy_func):
+    start = time.perf_counter()
+    expected = python_func()
+    python_time = time.perf_counter() - start
+    start = time.perf_counter()
+    result = numpy_func()
+    numpy_time = time.perf_counter() - start
+    same = list(result) == expected if isinstance(result, np.ndarray) else result == expected
+    print(f"{label:8} Python: {python_time:.2f} s  NumPy: {numpy_time:.3f} s  "
+          f"({python_time / numpy_time:.0f}x faster, same result: {same})")
+
+compare("map", lambda: list(map(lambda x: x * x, numbers_list)), lambda: vmap(lambda x: x * x, numbers_array))
+compare("filter", lambda: list(filter(lambda x: x % 2 == 0, numbers_list)), lambda: vfilter(lambda x: x % 2 == 0, numbers_array))
+compare("product", lambda: reduce(lambda x, y: x * y, factors_list), lambda: vreduce(operator.mul, factors_array))
+compare("sum", lambda: reduce(lambda x, y: x + y, numbers_list), lambda: vreduce(operator.add, numbers_array))
+
+# ## 8. Fast Fibonacci Numbers at Any Index
+
+# `fibonacci_generator` is perfect for reading the sequence in order, but to get the millionth number
+# it has to compute all the 999,999 numbers before it.
+
+# The **fast doubling** method jumps directly to any index using two identities:
+# - F(2k)     = F(k) * (2 * F(k+1) - F(k))
+# - F(2k + 1) = F(k)² + F(k+1)²
+# Reading the bits of `n` from left to right, each step doubles the index (and adds one when the bit is 1),
+# so F(n) takes about log2(n) steps: 20 steps for n = 1,000,000.
+
+# ### Example: `fib(n)` with fast doubling
+
+# Return (F(n), F(n + 1))
+def fib_pair(n):
+    if n < 0:
+        raise ValueError("n must be a non-negative integer")
+    a, b = 0, 1  # F(0), F(1)
+    for bit in bin(n)[2:]:
+        c = a * (2 * b - a)  # F(2k)
+        d = a * a + b * b    # F(2k + 1)
+        a, b = (d, c + d) if bit == '1' else (c, d)
+    return a, b
+
+def fib(n):
+    return fib_pair(n)[0]
+
+print([fib(n) for n in range(10)])  # Output: [0, 1, 1, 2, 3, 5, 8, 13, 21, 34]
+print(fib(1_000_000).bit_length())  # Output: 694241 (F(1,000,000) is a 694,241-bit number)
+
+# ### Example: A range of Fibonacci numbers
+
+# For a range, we jump to the start with fast doubling and then continue with one addition per number,
+# like the generator does.
+def fib_range(start, stop):
+    if stop <= start:
+        return []
+    a, b = fib_pair(start)
+    values = []
+    for _ in range(stop - start):
+        values.append(a)
+        a, b = b, a + b
+    return values
+
+print(fib_range(10, 15))  # Output: [55, 89, 144, 233, 377]
+
+# ### Example: A memoized prefix table
+
+# When the same small indices are requested again and again, it is faster to keep the beginning of the sequence
+# in a list: any index below `limit` becomes a simple list lookup. Larger indices use fast doubling.
+class FibonacciTable:
+    def __init__(self, limit=10_000):
+        self.limit = limit
+        self.values = [0, 1]
+
+    def __getitem__(self, n):
+        if n < 0:
+            raise ValueError("n must be a non-negative integer")
+        if n >= self.limit:
+            return fib(n)
+        values = self.values
+        while len(values) <= n:  # Extend the table up to n, only once
+            values.append(values[-1] + values[-2])
+        return values[n]
+
+    def range(self, start, stop):
+        if stop <= start:
+            return []
+        if start < 0:  # Same check as fib_range, instead of a slice counted from the end
+            raise ValueError("n must be a non-negative integer")
+        if stop <= self.limit:
+            self[stop - 1]
+            return self.values[start:stop]
+        return fib_range(start, stop)
+
+fib_table = FibonacciTable()
+print(fib_table[90], fib_table.range(5, 10))  # Output: 2880067194370816120 [5, 8, 13, 21, 34]
+print(fib_table.range(0, 0))                  # Output: []
+
+# ### Benchmark: fast doubling vs the generator
+
+def nth_from_generator(n):
+    return next(itertools.islice(fibonacci_generator(), n, None))
+
+for n in [1_000, 10_000, 100_000, 1_000_000]:
+    start = time.perf_counter()
+    expected = nth_from_generator(n)  # About 10 seconds for n = 1,000,000
+    generator_time = time.perf_counter() - start
+    start = time.perf_counter()
+    assert fib(n) == expected
+    doubling_time = time.perf_counter() - start
+    print(f"n = {n:>9,}  generator: {generator_time:8.4f} s  fast doubling: {doubling_time:.4f} s")
+
+# A range deep in the sequence: 1,000 numbers starting at index 500,000
+start = time.perf_counter()
+values = fib_range(500_000, 501_000)
+print(f"fib_range(500_000, 501_000): {time.perf_counter() - start:.3f} s")
+
+# ## 9. Picking the Top Items without Sorting Everything
+
+# `sorted(students, key=lambda student: student[1])` sorts the whole list. When we only need the best 10
+# students out of millions, most of that work is wasted. Two tools select the top items directly:
+# - `heapq.nlargest` / `heapq.nsmallest` keep a small heap of the best `k` items seen so far: O(n log k)
+#   instead of O(n log n), and they work on any iterable, even a generator
+# - NumPy's `argpartition` finds the positions of the `k` largest values of a numeric array in O(n), in C
+# Using `operator.itemgetter(1)` instead of `lambda student: student[1]` also helps: it is implemented in C.
+
+# ### Example: `top_k` helpers
+
+import heapq
+import random
+from operator import itemgetter
+
+def top_k(records, k, key=itemgetter(1), largest=True):
+    select = heapq.nlargest if largest else heapq.nsmallest
+    return select(k, records, key=key)
+
+def nsmallest(records, k, key=itemgetter(1)):
+    return top_k(records, k, key, largest=False)
+
+# Positions of the k largest (or smallest) values of a numeric array, best first
+def top_k_indices(values, k, largest=True):
+    values = np.asarray(values)
+    k = min(k, len(values))
+    if k == 0:
+        return np.array([], dtype=np.intp)
+    # No negation: -values wraps around for unsigned integers and fails for booleans
+    if largest:
+        candidates = np.argpartition(values, len(values) - k)[len(values) - k:]  # The k best, in no particular order
+        return candidates[np.argsort(values[candidates], kind='stable')[::-1]]
+    candidates = np.argpartition(values, k - 1)[:k]
+    return candidates[np.argsort(values[candidates], kind='stable')]
+
+# Same as top_k, for records whose key column holds numbers.
+# Note: among records with equal scores, the ones returned may differ from top_k.
+def top_k_numeric(records, k, column=1, largest=True):
+    values = np.fromiter(map(itemgetter(column), records), dtype=np.float64, count=len(records))
+    return [records[i] for i in top_k_indices(values, k, largest)]
+
+print(top_k(students, 2))       # Output: [('Charlie', 95), ('Alice', 85)]
+print(nsmallest(students, 1))   # Output: [('Bob', 75)]
+print(top_k_numeric(students, 2))  # Output: [('Charlie', 95), ('Alice', 85)]
+print(top_k_indices(np.array([0, 5, 3], dtype=np.uint32), 1))  # Output: [1]
+
+# ### Example: Top k of an unbounded stream
+
+# For data that never ends (a live feed of scores), we keep the heap ourselves and can look at the
+# current top k at any time. Memory stays at k items, whatever the length of the stream.
+
+# A key that compares the other way round, so the same heap code keeps the smallest items.
+# Unlike `-key`, it works for any comparable key: strings, dates, tuples...
+class ReversedKey:
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __gt__(self, other):
+        return other.value > self.value
+
+class TopK:
+    def __init__(self, k, key=itemgetter(1), largest=True):
+        self.k = k
+        self.key = key
+        self.largest = largest
+        self.heap = []  # The worst of the current top k is at heap[0]
+        self.counter = itertools.count()  # Breaks ties, so records themselves are never compared
+
+    def push(self, record):
+        self.extend((record,))
+
+    def extend(self, records):
+        heap, k, key, counter = self.heap, self.k, self.key, self.counter
+        if not self.largest:
+            key = lambda record, key=key: ReversedKey(key(record))
+        for record in records:
+            value = key(record)
+            if len(heap) < k:
+                heapq.heappush(heap, (value, -next(counter), record))
+            elif value > heap[0][0]:  # Most records are not good enough: skip them without building a tuple
+                heapq.heapreplace(heap, (value, -next(counter), record))
+
+    def result(self):
+        return [record for _, _, record in sorted(self.heap, reverse=True)]
+
+# Yield the current top k every `every` records of a (possibly infinite) iterable
+def stream_top_k(records, k, every=1000, key=itemgetter(1), largest=True):
+    tracker = TopK(k, key, largest)
+    for batch in Stream(records).batch(every):
+        tracker.extend(batch)
+        yield tracker.result()
+
+def score_feed():
+    rng = random.Random(0)
+    while True:  # An endless stream of (player, score)
+        yield (f"player{rng.randrange(1000)}", rng.randrange(1_000_000))
+
+for leaderboard in itertools.islice(stream_top_k(score_feed(), 3, every=100_000), 3):
+    print(leaderboard)
+
+# The smallest items work with any key, here the names
+first_names = TopK(2, key=itemgetter(0), largest=False)
+first_names.extend(students)
+print(first_names.result())  # Output: [('Alice', 85), ('Bob', 75)]
+
+# ### Benchmark: Top 10 out of 2 million records
+
+rng = random.Random(42)
+records = [(f"student{i}", rng.random()) for i in range(2_000_000)]
+scores = np.array([score for _, score in records])
+
+def benchmark_top_k(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:45} {time.perf_counter() - start:.3f} s")
+    return result
+
+expected = benchmark_top_k("sorted(..., key=lambda)[:10]", lambda: sorted(records, key=lambda r: r[1], reverse=True)[:10])
+assert benchmark_top_k("top_k (heapq + itemgetter)", lambda: top_k(records, 10)) == expected
+assert benchmark_top_k("top_k_numeric (argpartition)", lambda: top_k_numeric(records, 10)) == expected
+assert benchmark_top_k("top_k_indices (scores already in an array)", lambda: [records[i] for i in top_k_indices(scores, 10)]) == expected
+tracker = TopK(10)
+assert benchmark_top_k("TopK streaming", lambda: tracker.extend(records) or tracker.result()) == expected
@@ -104,3 +104,544 @@ print(motorcycle.start_engine()) # Output: The engine of the motorcycle Harley-D
 
 # Note: We cannot instantiate the Vehicle class directly
 # vehicle = Vehicle("Generic", "Model")  # This will throw an error because Vehicle is abstract
+
+# ## 4. Memory-Efficient Classes with `__slots__`
+
+# By default, every instance stores its attributes in its own dictionary (`obj.__dict__`).
+# Dictionaries are flexible (you can add any attribute at any time), but they take a lot of memory.
+# With millions of animals, most of the memory is spent on these dictionaries.
+
+# ### Option 1: `__slots__`
+
+# Declaring `__slots__` tells Python exactly which attributes an instance can have.
+# The attributes are then stored in fixed slots inside the object, and there is no `__dict__`.
+# The public interface is the same: same constructor, same attributes, same `speak` method.
+
+class SlottedAnimal:
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def speak(self):
+        return f"{self.name} makes a sound."
+
+class SlottedDog(SlottedAnimal):
+    __slots__ = ('breed',)  # Only the new attribute: `name` comes from the parent
+
+    def __init__(self, name, breed):
+        super().__init__(name)
+        self.breed = breed
+
+    def speak(self):
+        return f"{self.name}, the {self.breed}, barks."
+
+class SlottedCat(SlottedAnimal):
+    __slots__ = ('color',)
+
+    def __init__(self, name, color):
+        super().__init__(name)
+        self.color = color
+
+    def speak(self):
+        return f"{self.name}, the {self.color} cat, meows."
+
+print(SlottedDog("Buddy", "Golden Retriever").speak())  # Output: Buddy, the Golden Retriever, barks.
+
+# Note: a slotted object cannot get new attributes: `SlottedDog("Rex", "Boxer").age = 3` raises AttributeError.
+
+# ### Option 2: A columnar table
+
+# With millions of animals, many of them share the same breed or color. Instead of one object per animal,
+# we can store each attribute in its own column (a "struct of arrays"):
+# - the kind of animal is one byte in an `array`
+# - names are kept in a list, with `sys.intern` so repeated names are stored once
+# - breeds and colors are **dictionary-encoded**: each distinct value is stored once, and each row only
+#   keeps a small integer code pointing to it
+# When we need an object, the table hands out a lightweight *view* that reads the columns on demand.
+
+import sys
+from array import array
+
+ANIMAL, DOG, CAT, OTHER = 0, 1, 2, 3
+
+# The classes whose rows can be rebuilt from the columns; any other class (even a subclass) keeps its object
+KINDS_BY_CLASS = {Animal: ANIMAL, SlottedAnimal: ANIMAL, Dog: DOG, SlottedDog: DOG, Cat: CAT, SlottedCat: CAT}
+
+# Stores each distinct value once and gives it an integer code
+class DictionaryColumn:
+    def __init__(self):
+        self.values = []
+        self.codes_by_value = {}
+        self.codes = array('i')  # One code per row, -1 when the row has no value
+
+    def append(self, value):
+        if value is None:
+            self.codes.append(-1)
+            return
+        code = self.codes_by_value.get(value)
+        if code is None:
+            code = self.codes_by_value[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def __getitem__(self, row):
+        code = self.codes[row]
+        return None if code < 0 else self.values[code]
+
+class AnimalView:
+    __slots__ = ('_table', '_row')
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    @property
+    def name(self):
+        return self._table.names[self._row]
+
+    @property
+    def breed(self):
+        return self._table.breeds[self._row]
+
+    @property
+    def color(self):
+        return self._table.colors[self._row]
+
+    def speak(self):
+        return self._table.speak(self._row)
+
+class AnimalTable:
+    def __init__(self):
+        self.kinds = array('b')
+        self.names = []
+        self.breeds = DictionaryColumn()
+        self.colors = DictionaryColumn()
+        self.others = {}  # row -> object, for the rows of kind OTHER
+
+    def append(self, kind, name, breed=None, color=None):
+        self.kinds.append(kind)
+        self.names.append(sys.intern(name))
+        self.breeds.append(breed)
+        self.colors.append(color)
+
+    def add_dog(self, name, breed):
+        self.append(DOG, name, breed=breed)
+
+    def add_cat(self, name, color):
+        self.append(CAT, name, color=color)
+
+    @classmethod
+    def from_animals(cls, animals):
+        table = cls()
+        for animal in animals:
+            # The exact class, like get_speak_many: a subclass of Dog may override speak
+            kind = KINDS_BY_CLASS.get(type(animal), OTHER)
+            if kind == DOG:
+                table.add_dog(animal.name, animal.breed)
+            elif kind == CAT:
+                table.add_cat(animal.name, animal.color)
+            elif kind == ANIMAL:
+                table.append(ANIMAL, animal.name)
+            else:
+                table.others[len(table)] = animal
+                table.append(OTHER, animal.name, getattr(animal, 'breed', None), getattr(animal, 'color', None))
+        return table
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, row):
+        if not -len(self) <= row < len(self):
+            raise IndexError("AnimalTable index out of range")
+        return AnimalView(self, row % len(self))
+
+    def __iter__(self):
+        return (AnimalView(self, row) for row in range(len(self)))
+
+    # Same text as the speak methods of Dog and Cat
+    def speak(self, row):
+        kind = self.kinds[row]
+        if kind == DOG:
+            return f"{self.names[row]}, the {self.breeds[row]}, barks."
+        if kind == CAT:
+            return f"{self.names[row]}, the {self.colors[row]} cat, meows."
+        if kind == OTHER:
+            return self.others[row].speak()
+        return f"{self.names[row]} makes a sound."
+
+table = AnimalTable.from_animals([dog, cat])
+print(table[0].speak(), table[1].color)  # Output: Buddy, the Golden Retriever, barks. white
+
+# ### Benchmark: dict vs slots vs columnar
+
+import time
+import tracemalloc
+
+N_ANIMALS = 1_000_000
+BREEDS = ["Golden Retriever", "Labrador", "Beagle", "Poodle", "Bulldog"]
+COLORS = ["white", "black", "orange", "grey"]
+NAMES = [f"Pet{i}" for i in range(1000)]
+
+def build(dog_class, cat_class):
+    return [dog_class(NAMES[i % 1000], BREEDS[i % 5]) if i % 2 == 0 else cat_class(NAMES[i % 1000], COLORS[i % 4])
+            for i in range(N_ANIMALS)]
+
+def build_table():
+    table = AnimalTable()
+    for i in range(N_ANIMALS):
+        if i % 2 == 0:
+            table.add_dog(NAMES[i % 1000], BREEDS[i % 5])
+        else:
+            table.add_cat(NAMES[i % 1000], COLORS[i % 4])
+    return table
+
+def measure_layout(label, builder):
+    tracemalloc.start()
+    animals = builder()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    total_length = sum(len(animal.name) for animal in animals)
+    access_time = time.perf_counter() - start
+    print(f"{label:22} memory: {memory / 1e6:6.1f} MB  reading every name: {access_time:.3f} s")
+    return animals
+
+measure_layout("dict (Dog/Cat)", lambda: build(Dog, Cat))
+measure_layout("__slots__", lambda: build(SlottedDog, SlottedCat))
+table = measure_layout("AnimalTable (views)", build_table)
+
+# Working on the columns directly is the fastest way to read a table
+start = time.perf_counter()
+total_length = sum(map(len, table.names))
+print(f"{'AnimalTable (column)':22} reading every name: {time.perf_counter() - start:.3f} s")
+
+# Typical results for 1,000,000 animals:
+# - dict: ~95 MB, `__slots__`: ~55 MB (about 40% less), AnimalTable: ~18 MB (about 80% less)
+# - `__slots__` keeps attribute access about as fast as normal objects
+# - Views are slower per attribute (each read goes through a property), so use them for a few rows
+#   and work on the columns directly (`table.names`, `table.breeds.codes`) for bulk processing
+
+# ## 5. Batch Polymorphism: Speaking for Millions of Animals
+
+# `animal_speak(animal)` is perfect for one object: one method call, one `print`.
+# With millions of animals, the per-object costs add up: a method lookup, a call and a `print` for each one
+# (each `print` goes through the whole I/O stack).
+
+# A batch version does the same job in three steps:
+# 1. Group the objects by their concrete class (Dog, Cat, ...)
+# 2. Ask each class to speak for all of its objects at once with a `speak_many` hook.
+#    If a class has no hook, fall back to calling `speak()` on each object.
+# 3. Write all the lines with a single buffered writer instead of one `print` per line
+
+# ### Example: The `speak_many` hook
+
+# A class gets a batch hook with the `speak_many_for` decorator.
+# The hook receives a list of objects of that class and returns one line per object, in the same order.
+
+from operator import attrgetter
+
+def speak_many_for(*classes):
+    def register(func):
+        for cls in classes:
+            cls.speak_many = staticmethod(func)
+        return func
+    return register
+
+@speak_many_for(Dog, SlottedDog)
+def dogs_speak(dogs):
+    # attrgetter reads both attributes in C, without a Python-level method call per dog
+    return [f"{name}, the {breed}, barks." for name, breed in map(attrgetter('name', 'breed'), dogs)]
+
+@speak_many_for(Cat, SlottedCat)
+def cats_speak(cats):
+    return [f"{name}, the {color} cat, meows." for name, color in map(attrgetter('name', 'color'), cats)]
+
+# The hook is looked up in the class itself (`cls.__dict__`), not inherited:
+# a subclass of Dog that overrides `speak` must not use the Dog hook, so it falls back to its own `speak`.
+def get_speak_many(cls):
+    hook = cls.__dict__.get('speak_many')
+    return hook.__func__ if isinstance(hook, staticmethod) else hook
+
+# ### Example: `speak_all`
+
+# The collection is processed in chunks, so the memory used for grouping stays small
+# and the lines are written in the original order.
+
+import io
+import itertools
+
+def speak_all(animals, out=None, chunk_size=100_000):
+    out = sys.stdout if out is None else out
+    animals = iter(animals)
+    while True:
+        chunk = list(itertools.islice(animals, chunk_size))
+        if not chunk:
+            break
+        # 1. Group by concrete class, remembering the position of each object
+        groups = {}
+        for position, animal in enumerate(chunk):
+            group = groups.get(type(animal))
+            if group is None:
+                group = groups[type(animal)] = ([], [])
+            group[0].append(position)
+            group[1].append(animal)
+        # 2. One call per class
+        lines = [None] * len(chunk)
+        for cls, (positions, objects) in groups.items():
+            hook = get_speak_many(cls)
+            texts = hook(objects) if hook is not None else [animal.speak() for animal in objects]
+            for position, text in zip(positions, texts):
+                lines[position] = text
+        # 3. One write per chunk
+        out.write("\n".join(lines))
+        out.write("\n")
+
+class Puppy(Dog):
+    def speak(self):
+        return f"{self.name}, the {self.breed} puppy, yips."
+
+speak_all([dog, cat, Puppy("Rex", "Boxer"), Animal("Generic")])
+# Output:
+# Buddy, the Golden Retriever, barks.
+# Whiskers, the white cat, meows.
+# Rex, the Boxer puppy, yips.
+# Generic makes a sound.
+
+# ### Benchmark: 10 million mixed Dogs and Cats
+
+# Both versions write to `os.devnull`, so we measure the Python work and not the terminal.
+# `animal_speak` uses `print`, so we redirect `sys.stdout` for it.
+# The batch version gets a writer with a 1 MB buffer.
+# Note: 10 million Dog/Cat objects need about 1 GB of memory (see the previous section).
+
+import contextlib
+import os
+
+N_MIXED = 10_000_000
+mixed = [Dog(NAMES[i % 1000], BREEDS[i % 5]) if i % 3 else Cat(NAMES[i % 1000], COLORS[i % 4])
+         for i in range(N_MIXED)]
+
+with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+    start = time.perf_counter()
+    for animal in mixed:
+        animal_speak(animal)
+    one_by_one = time.perf_counter() - start
+
+with open(os.devnull, 'w', buffering=1 << 20) as devnull:
+    start = time.perf_counter()
+    speak_all(mixed, out=devnull)
+    batched = time.perf_counter() - start
+
+print(f"animal_speak one by one: {one_by_one:.2f} s")
+print(f"speak_all (batched):     {batched:.2f} s  ({one_by_one / batched:.1f}x faster)")
+
+# Check that both versions produce exactly the same text
+sample = mixed[:1000] + [Puppy("Rex", "Boxer")]
+expected = io.StringIO()
+with contextlib.redirect_stdout(expected):
+    for animal in sample:
+        animal_speak(animal)
+batch_output = io.StringIO()
+speak_all(sample, out=batch_output, chunk_size=300)
+assert batch_output.getvalue() == expected.getvalue()
+del mixed
+
+# Typical result: the batched version is about 2-3x faster, with identical output.
+
+# ## 6. A Plugin Registry for Vehicles
+
+# In section 3, `Car` and `Motorcycle` are hard-wired: the code that uses them must import them.
+# With hundreds of vehicle types, importing all of them at startup is slow, even if a program only needs one.
+
+# A registry solves this. Each vehicle type is registered under a key ("car", "truck", ...), in one of two ways:
+# - **eagerly**: the class registers itself when it is defined, using `__init_subclass__`
+# - **lazily**: we only register a string `"module:Class"`; the module is imported the first time
+#   somebody asks for that key. Installed packages can announce their plugins this way through *entry points*.
+
+# ### Example: The registry
+
+import functools
+import importlib
+from importlib.metadata import entry_points
+
+# Checking `issubclass` against an ABC is cached per class.
+# The cache must be cleared when a new class is registered with `Vehicle.register`, because the answer can change.
+@functools.lru_cache(maxsize=None)
+def is_vehicle_type(cls):
+    return issubclass(cls, Vehicle)
+
+def is_vehicle(obj):
+    return is_vehicle_type(type(obj))
+
+class VehicleRegistry:
+    def __init__(self):
+        self._classes = {}  # key -> class (already imported)
+        self._specs = {}    # key -> "module:Class" (not imported yet)
+
+    def register(self, key, cls):
+        self._classes[key] = cls
+        self._specs.pop(key, None)
+
+    def register_lazy(self, key, spec):
+        if key not in self._classes:
+            self._specs[key] = spec
+
+    # Entry points are declared by installed packages, e.g. in their pyproject.toml:
+    #   [project.entry-points."vehicles.plugins"]
+    #   truck = "fleet.truck:Truck"
+    # Reading them does not import anything: we only keep the "module:Class" string.
+    def load_entry_points(self, group="vehicles.plugins"):
+        found = entry_points(group=group)
+        for entry_point in found:
+            self.register_lazy(entry_point.name, entry_point.value)
+        return len(found)
+
+    def get(self, key):
+        cls = self._classes.get(key)
+        if cls is not None:
+            return cls
+        spec = self._specs.get(key)
+        if spec is None:
+            raise KeyError(f"Unknown vehicle type: {key!r}")
+        module_name, _, class_name = spec.partition(':')
+        module = importlib.import_module(module_name)
+        # Importing the module may already have registered the class (through __init_subclass__)
+        cls = self._classes.get(key) or getattr(module, class_name)
+        if not issubclass(cls, Vehicle):
+            # Plugins do not have to import our code: any class with a start_engine method
+            # is accepted and registered as a *virtual* subclass of the Vehicle ABC
+            if not callable(getattr(cls, 'start_engine', None)):
+                raise TypeError(f"{spec} does not implement start_engine()")
+            Vehicle.register(cls)
+            is_vehicle_type.cache_clear()
+        self.register(key, cls)
+        return cls
+
+    def create(self, key, *args, **kwargs):
+        return self.get(key)(*args, **kwargs)
+
+    def __contains__(self, key):
+        return key in self._classes or key in self._specs
+
+    def keys(self):
+        return self._classes.keys() | self._specs.keys()
+
+    def loaded(self):
+        return sorted(self._classes)
+
+vehicles = VehicleRegistry()
+vehicles.register("car", Car)
+vehicles.register("motorcycle", Motorcycle)
+vehicles.load_entry_points()  # No plugins are installed in this environment, so nothing is added
+
+# Subclasses of RegisteredVehicle register themselves with a `key` class argument
+class RegisteredVehicle(Vehicle):
+    def __init_subclass__(cls, key=None, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if key is not None:
+            vehicles.register(key, cls)
+
+class Truck(RegisteredVehicle, key="truck"):
+    def start_engine(self):
+        return f"The engine of the truck {self.make} {self.model} starts with a roar."
+
+print(vehicles.create("truck", "Volvo", "FH16").start_engine())
+# Output: The engine of the truck Volvo FH16 starts with a roar.
+print(vehicles.create("car", "Toyota", "Corolla").start_engine())
+# Output: The engine of the car Toyota Corolla starts with a key.
+
+# ### Example: Lazy plugins
+
+# Let's create a package with 300 plugin modules. Each one takes some time to import
+# (here it builds a small table, like a real module that loads data or heavy dependencies).
+# The plugins do not import our code: they only follow the same interface.
+
+import shutil
+import subprocess
+import tempfile
+
+N_PLUGINS = 300
+plugin_dir = tempfile.mkdtemp()
+os.makedirs(os.path.join(plugin_dir, "fleet_plugins"))
+open(os.path.join(plugin_dir, "fleet_plugins", "__init__.py"), "w").close()
+for i in range(N_PLUGINS):
+    with open(os.path.join(plugin_dir, "fleet_plugins", f"vehicle_{i:03}.py"), "w") as f:
+        f.write(f'''import math
+
+GEAR_RATIOS = [math.sin(i) for i in range(20_000)]
+
+class Vehicle{i:03}:
+    def __init__(self, make, model):
+        self.make = make
+        self.model = model
+
+    def start_engine(self):
+        return f"The engine of vehicle type {i:03} ({{self.make}} {{self.model}}) starts."
+''')
+sys.path.insert(0, plugin_dir)
+
+# Clean up the plugin directory, the sys.path entry and the imported modules when the demo ends.
+try:
+    # Registering 300 lazy plugins only stores strings
+    start = time.perf_counter()
+    for i in range(N_PLUGINS):
+        vehicles.register_lazy(f"vehicle-{i:03}", f"fleet_plugins.vehicle_{i:03}:Vehicle{i:03}")
+    print(f"Registering {N_PLUGINS} lazy plugins: {(time.perf_counter() - start) * 1e3:.2f} ms")
+
+    start = time.perf_counter()
+    bus = vehicles.create("vehicle-042", "Mercedes", "Citaro")
+    print(f"First lookup (imports one module): {(time.perf_counter() - start) * 1e3:.2f} ms")
+    start = time.perf_counter()
+    vehicles.get("vehicle-042")
+    print(f"Second lookup (cached):            {(time.perf_counter() - start) * 1e6:.2f} us")
+
+    print(bus.start_engine())                      # Output: The engine of vehicle type 042 (Mercedes Citaro) starts.
+    print(isinstance(bus, Vehicle), is_vehicle(bus))  # Output: True True
+    print(len(vehicles.keys()), vehicles.loaded())  # Output: 303 ['car', 'motorcycle', 'truck', 'vehicle-042']
+
+    # ### Measuring cold start with `-X importtime`
+
+    # `python -X importtime` prints one line per imported module to stderr:
+    #   import time: self [us] | cumulative | imported package
+    # We run two fresh interpreters: one imports every plugin (the hard-wired approach),
+    # the other imports only the plugin it needs (what the lazy registry does on first lookup).
+
+    def import_time_report(code, prefix="fleet_plugins"):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                                cwd=plugin_dir, capture_output=True, text=True, check=True)
+        modules = 0
+        total_us = 0
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:"):
+                continue
+            self_us, _, name = line[len("import time:"):].split("|")
+            if name.strip().startswith(prefix):
+                modules += 1
+                total_us += int(self_us)
+        return modules, total_us
+
+    eager_code = "; ".join(f"import fleet_plugins.vehicle_{i:03}" for i in range(N_PLUGINS))
+    lazy_code = "import fleet_plugins.vehicle_042"
+    for label, code in [("Import all plugins", eager_code), ("Lazy: import one", lazy_code)]:
+        modules, total_us = import_time_report(code)
+        print(f"{label:20} {modules:4} modules  {total_us / 1e3:8.1f} ms")
+finally:
+    sys.path.remove(plugin_dir)
+    for name in [name for name in sys.modules if name == "fleet_plugins" or name.startswith("fleet_plugins.")]:
+        del sys.modules[name]
+    shutil.rmtree(plugin_dir)
+
+# ### Cached type checks
+
+# `isinstance(obj, Vehicle)` goes through the ABC machinery, which is slower for virtual subclasses
+# (classes added with `Vehicle.register`). `is_vehicle` answers from a per-class cache.
+import timeit
+
+print(f"isinstance(bus, Vehicle): {timeit.timeit(lambda: isinstance(bus, Vehicle), number=1_000_000):.3f} s per 1M")
+print(f"is_vehicle(bus):          {timeit.timeit(lambda: is_vehicle(bus), number=1_000_000):.3f} s per 1M")
+
+# Typical results:
+# - importing all 300 plugins takes ~700 ms; the lazy registry imports one module on first lookup (~3 ms)
+# - after the first lookup, `vehicles.get` is a dictionary lookup (~1-2 us)
+# - the cached `is_vehicle` check is ~3x faster than `isinstance` for virtual subclasses
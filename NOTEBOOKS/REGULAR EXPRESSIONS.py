@@ -125,3 +125,747 @@ dirty_text = "Hello! Welcome to @Python_101. Let's clean this #text?"
 # Remove all non-alphanumeric characters (excluding spaces)
 clean_text = re.sub(r'[^\w\s]', '', dirty_text)
 print("Cleaned text:", clean_text)
+
+# ## 4. Performance: Compiling Patterns Once
+
+# `validate_email` and `validate_phone_number` pass the pattern as a string to `re.match`.
+# On every call, `re` has to look the string up in its internal cache of compiled patterns.
+# That cache is small and shared by the whole program, so when many different patterns are used,
+# they can push each other out and get compiled again.
+
+# A better approach is to compile each pattern once with `re.compile` and keep the compiled object.
+# A small registry gives every pattern a name and compiles it the first time it is used.
+
+# ### Example: A pattern registry
+
+class PatternRegistry:
+    def __init__(self):
+        self._sources = {}   # name -> (pattern, flags)
+        self._compiled = {}  # name -> compiled pattern
+
+    def register(self, name, pattern, flags=0):
+        self._sources[name] = (pattern, flags)
+        self._compiled.pop(name, None)
+
+    # Compile the pattern on first use, then always return the same object
+    def get(self, name):
+        try:
+            return self._compiled[name]
+        except KeyError:
+            compiled = self._compiled[name] = re.compile(*self._sources[name])
+            return compiled
+
+    __getitem__ = get
+
+    def names(self):
+        return list(self._sources)
+
+patterns = PatternRegistry()
+patterns.register('email', r'^[\w.-]+@[\w.-]+\.\w{2,4}$')
+patterns.register('phone', r'^\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}$')
+patterns.register('date', date_pattern)
+
+# The validators compile their pattern once, when this code runs, and keep its `match` method
+email_match = patterns['email'].match
+phone_match = patterns['phone'].match
+
+def validate_email_fast(email):
+    return email_match(email) is not None
+
+def validate_phone_number_fast(phone_number):
+    return phone_match(phone_number) is not None
+
+# ### Validating many values at once
+
+# When we have a whole list to check, a list comprehension over `map` avoids one Python function call per value.
+
+def validate_many(name, values):
+    match = patterns[name].match
+    return [m is not None for m in map(match, values)]
+
+def validate_emails(emails):
+    return validate_many('email', emails)
+
+def validate_phone_numbers(phone_numbers):
+    return validate_many('phone', phone_numbers)
+
+print(validate_emails(emails))  # Output: [True, False, True]
+print(validate_phone_numbers(phone_numbers))  # Output: [True, True, False, True]
+
+# ### Benchmark
+
+# Validate 10 million emails and 10 million phone numbers with each version.
+# (Lower N if this takes too long on your machine.)
+
+import itertools
+import time
+
+N = 10_000_000
+
+def benchmark(label, func, values):
+    start = time.perf_counter()
+    func(itertools.islice(itertools.cycle(values), N))
+    print(f"{label:40} {time.perf_counter() - start:.2f} s")
+
+# The benchmarks run under the guard: worker processes started later in this file import it again
+if __name__ == '__main__':
+    benchmark("validate_email (re.match with a string)", lambda items: [validate_email(e) for e in items], emails)
+    benchmark("validate_email_fast (compiled)", lambda items: [validate_email_fast(e) for e in items], emails)
+    benchmark("validate_emails (compiled, batch)", validate_emails, emails)
+
+    benchmark("validate_phone_number (re.match)", lambda items: [validate_phone_number(p) for p in items], phone_numbers)
+    benchmark("validate_phone_number_fast (compiled)", lambda items: [validate_phone_number_fast(p) for p in items], phone_numbers)
+    benchmark("validate_phone_numbers (compiled, batch)", validate_phone_numbers, phone_numbers)
+
+# ## 5. Searching Through Large Text Files
+
+# All the examples above work on small strings. A log file or a text dump can be several gigabytes,
+# too big to load with `file.read()`. Instead we read the file in chunks and search each chunk.
+
+# The tricky part is the chunk boundary: a date or an email can start at the end of one chunk
+# and finish at the start of the next one. To handle this, we assume no match is longer than `max_match` bytes:
+# - matches that end at least `max_match` bytes before the end of the buffer are complete, so we report them
+# - the rest of the buffer is kept and searched again together with the next chunk
+# Every match is reported once, with its byte offset in the file.
+
+# Note: we search bytes, not text, so the patterns are compiled as bytes patterns
+# (for bytes, `\w` and `\d` only match ASCII characters).
+
+import mmap
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+def compile_bytes(pattern):
+    flags = 0
+    if isinstance(pattern, re.Pattern):
+        # Keep re.I, re.M, ...; re.UNICODE is set on every str pattern but not allowed for bytes
+        pattern, flags = pattern.pattern, pattern.flags & ~re.UNICODE
+    if isinstance(pattern, str):
+        pattern = pattern.encode()
+    return re.compile(pattern, flags)
+
+# Yield (offset, match) for every match in the file, reading `chunk_size` bytes at a time
+def scan_file(path, pattern, chunk_size=1 << 20, max_match=256):
+    if chunk_size <= max_match:
+        raise ValueError("chunk_size must be larger than max_match")
+    regex = compile_bytes(pattern)
+    with open(path, 'rb') as file:
+        buffer = b''
+        buffer_offset = 0  # Position of buffer[0] in the file
+        pos = 0            # Where the next search starts in the buffer
+        while True:
+            chunk = file.read(chunk_size)
+            at_eof = not chunk
+            buffer += chunk
+            # Matches ending after `safe_end` could continue in the next chunk
+            safe_end = len(buffer) if at_eof else len(buffer) - max_match
+            next_start = len(buffer)
+            for match in regex.finditer(buffer, pos):
+                if match.end() > safe_end:
+                    next_start = match.start()
+                    break
+                yield buffer_offset + match.start(), match.group()
+                pos = match.end()
+            if at_eof:
+                return
+            pos = min(next_start, max(pos, safe_end))
+            # Drop the searched part, but keep `max_match` bytes before `pos` so that
+            # look-behinds and `\b` still see the characters in front of the next match
+            cut = max(0, pos - max_match)
+            buffer = buffer[cut:]
+            buffer_offset += cut
+            pos -= cut
+
+# ### Searching in parallel
+
+# Each worker process maps the file into memory with `mmap` (the OS loads only the pages it touches)
+# and searches one segment. `finditer(data, start)` starts searching at `start` but still sees the bytes
+# before it, so look-behinds and `\b` work at the segment boundary. A worker keeps only the matches that
+# *start* inside its own segment, and reads up to `max_match` bytes past its end to complete the last one.
+
+# A whole-file scan continues after the end of each match. When a match crosses into the next segment,
+# the worker of that segment started at the boundary instead, so its first matches can overlap the crossing
+# match and miss the right ones (for `\d{3}` on "123456789" cut after "1234", the worker would find "567"
+# instead of "789"). The parent fixes this: it scans again from the end of the crossing match
+# until it finds the same match as the worker. From there on, both scans agree.
+
+def scan_segment(path, pattern, start, end, max_match):
+    regex = compile_bytes(pattern)
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        search_end = min(len(data), end + max_match)
+        return [(match.start(), match.group()) for match in regex.finditer(data, start, search_end)
+                if match.start() < end]
+
+# Yield (offset, match) for every match, searching segments of the file in `processes` worker processes
+def scan_file_parallel(path, pattern, processes=None, segment_size=64 << 20, max_match=256):
+    size = os.path.getsize(path)
+    if size == 0:
+        return
+    regex = compile_bytes(pattern)
+    starts = range(0, size, segment_size)
+    ends = [min(start + segment_size, size) for start in starts]
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data, \
+            ProcessPoolExecutor(max_workers=processes) as pool:
+        segments = pool.map(scan_segment, itertools.repeat(path), itertools.repeat(pattern), starts, ends,
+                            itertools.repeat(max_match))
+        last_end = 0  # Where the whole-file scan would continue
+        for start, end, matches in zip(starts, ends, segments):  # Results come back in file order
+            if last_end > start:
+                # The previous match crosses the boundary: rescan from its end until we meet the worker's scan
+                worker_matches = dict(matches)
+                synced_at = None
+                for match in regex.finditer(data, last_end, min(size, end + max_match)):
+                    if match.start() >= end:
+                        break
+                    if worker_matches.get(match.start()) == match.group():
+                        synced_at = match.start()
+                        break
+                    yield match.start(), match.group()
+                    last_end = match.end()
+                matches = [] if synced_at is None else [m for m in matches if m[0] >= synced_at]
+            for offset, text in matches:
+                yield offset, text
+                last_end = offset + len(text)
+
+# ### Example: Extracting dates and emails from a large file
+
+email_search_pattern = r'\b[\w.-]+@[\w.-]+\.\w{2,4}\b'
+
+# Everything runs under the guard: with the "spawn" start method (Windows, macOS), every worker process imports
+# this file again, and must not rebuild the sample file
+if __name__ == '__main__':
+    # Create a sample file of about 30 MB, in a temporary directory that is removed at the end
+    sample_dir = tempfile.mkdtemp()
+    large_text = os.path.join(sample_dir, 'large_text.txt')
+    with open(large_text, 'w') as file:
+        for i in range(300_000):
+            file.write(f"Line {i}: user{i}@example.com booked a meeting on 2024-09-{i % 28 + 1:02d}, confirmed 09/10/2024.\n")
+
+    for offset, date in itertools.islice(scan_file(large_text, date_pattern), 3):
+        print(f"Found date {date.decode()} at byte {offset}")
+
+    start = time.perf_counter()
+    dates_found = sum(1 for _ in scan_file(large_text, date_pattern))
+    print(f"scan_file: {dates_found} dates in {time.perf_counter() - start:.2f} s")
+
+    start = time.perf_counter()
+    emails_found = list(scan_file_parallel(large_text, email_search_pattern, segment_size=4 << 20))
+    print(f"scan_file_parallel: {len(emails_found)} emails in {time.perf_counter() - start:.2f} s")
+
+    # Check against a search over the whole file loaded in memory
+    with open(large_text, 'rb') as file:
+        content = file.read()
+    assert dates_found == len(compile_bytes(date_pattern).findall(content))
+    assert emails_found == [(m.start(), m.group()) for m in compile_bytes(email_search_pattern).finditer(content)]
+    shutil.rmtree(sample_dir)
+
+# ## 6. Extracting Emails, Dates and Phone Numbers in One Pass
+
+# To pull emails, dates and phone numbers out of a text, we could run three searches: one per pattern.
+# Each search walks over the whole text, so a large corpus is read three times.
+
+# Instead, we can join the patterns into a single alternation, giving each one a **named group**:
+# `(?P<email>...)|(?P<date>...)|(?P<phone>...)`
+# For every match, `match.lastgroup` tells us which kind of data was found.
+
+# The regex engine still tries every alternative at every position, so the alternation alone is about as fast
+# as three passes. The real gain comes from a cheap **prefilter**: every email contains `@` and every date or
+# phone number contains a digit, so lines without `@` or digits can be skipped without running the big pattern.
+# Checking for a single character class is much faster than trying three patterns at each position.
+
+# Note: because the text is processed line by line, a match never spans two lines.
+# Where two kinds could match the same text, the one listed first wins.
+
+# ### Example: A single-pass extractor
+
+# Unanchored versions of the validators, for searching inside a text
+patterns.register('email_search', email_search_pattern)
+patterns.register('phone_search', r'(?<!\w)\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}\b')
+
+class MultiExtractor:
+    # `kinds` maps each kind of data to a pattern name in the registry.
+    # `prefilter` must match at least one character of every possible match.
+    def __init__(self, kinds, prefilter=r'[\d@]'):
+        self.kinds = list(kinds)
+        self.regex = re.compile('|'.join(f"(?P<{kind}>{patterns[name].pattern})" for kind, name in kinds.items()))
+        self.prefilter = re.compile(prefilter)
+
+    # Yield (kind, offset, value) for every match, in the order they appear in the text
+    def finditer(self, text):
+        offset = 0
+        for line in text.splitlines(keepends=True):
+            if self.prefilter.search(line):
+                for match in self.regex.finditer(line):
+                    yield match.lastgroup, offset + match.start(), match.group()
+            offset += len(line)
+
+    # Return the matches grouped by kind
+    def extract(self, text):
+        found = {kind: [] for kind in self.kinds}
+        for kind, _, value in self.finditer(text):
+            found[kind].append(value)
+        return found
+
+extractor = MultiExtractor({'email': 'email_search', 'date': 'date', 'phone': 'phone_search'})
+
+sample_text = "Call (555) 123-4567 or write to alice@example.com before 2024-09-07.\nBob is free on 09/10/2024."
+print(extractor.extract(sample_text))
+# Output: {'email': ['alice@example.com'], 'date': ['2024-09-07', '09/10/2024'], 'phone': ['(555) 123-4567']}
+
+# ### Benchmark: One pass vs three passes
+
+def three_passes(text):
+    return {
+        'email': patterns['email_search'].findall(text),
+        'date': patterns['date'].findall(text),
+        'phone': patterns['phone_search'].findall(text),
+    }
+
+data_line = ("Call Alice at (555) 123-4567 or write to alice.smith@example.com before 2024-09-07; "
+             "Bob (bob@mail.org) is free on 09/10/2024, his number is 555.987.6543.\n")
+filler_line = "The quick brown fox jumps over the lazy dog while the meeting notes are being written down.\n"
+
+if __name__ == '__main__':
+    corpora = {
+        'every line has data': data_line * 50_000,
+        '1 line in 10 has data': (data_line + filler_line * 9) * 5_000,
+        '1 line in 100 has data': (data_line + filler_line * 99) * 500,
+    }
+
+    for label, corpus in corpora.items():
+        start = time.perf_counter()
+        expected = three_passes(corpus)
+        separate_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = extractor.extract(corpus)
+        single_time = time.perf_counter() - start
+
+        assert found == expected
+        print(f"{label:25} three passes: {separate_time:.2f} s  one pass: {single_time:.2f} s  ({separate_time / single_time:.1f}x)")
+
+# ## 7. Cleaning Text in Bulk with pandas
+
+# `re.sub(r'[^\w\s]', '', dirty_text)` cleans one string. With a pandas column of millions of rows,
+# calling it once per row is slow. Here are batch versions of the cleaning rule, the date extraction
+# and the validators that work on a whole pandas Series (or a plain list) and give exactly the same results.
+
+# ### Deleting characters with `str.translate`
+
+# A rule that removes single characters does not need a regex at all: `str.translate` can delete characters
+# using a lookup table, and it runs entirely in C.
+# Building a table for every Unicode character would be huge, so the table below decides for each character
+# the first time it is seen (using the original regex, so the result is identical) and remembers the answer.
+
+class DeletionTable(dict):
+    def __init__(self, char_pattern):
+        super().__init__()
+        self.regex = re.compile(char_pattern)
+
+    # Called by `str.translate` for characters that are not in the table yet
+    def __missing__(self, code_point):
+        value = None if self.regex.fullmatch(chr(code_point)) else code_point  # None means "delete"
+        self[code_point] = value
+        return value
+
+special_chars = DeletionTable(r'[^\w\s]')
+
+def clean_text_fast(text):
+    return text.translate(special_chars)
+
+print(clean_text_fast(dirty_text))  # Output: Hello Welcome to Python_101 Lets clean this text
+
+# ### Batch functions for Series and lists
+
+import pandas as pd
+
+# pandas may store strings with a different regex engine (pyarrow), whose `\w` only matches ASCII.
+# Converting to Python objects guarantees the same results as the `re` module.
+def as_python_strings(series):
+    return series if series.dtype == object else series.astype(object)
+
+# Missing values (None, NaN) stay missing: the Series versions give NaN for them, the list versions give None
+def clean_texts(values):
+    if isinstance(values, pd.Series):
+        return values.str.translate(special_chars)
+    return [value.translate(special_chars) if isinstance(value, str) else None for value in values]
+
+def extract_dates_many(values):
+    regex = patterns['date']
+    if isinstance(values, pd.Series):
+        return as_python_strings(values).str.findall(regex)
+    return [regex.findall(value) if isinstance(value, str) else None for value in values]
+
+# Like `validate_many` from section 4, but also accepts a Series. Missing values (None, NaN, <NA>) are not valid.
+def validate_series(name, values):
+    if isinstance(values, pd.Series):
+        return as_python_strings(values).str.match(patterns[name], na=False)
+    match = patterns[name].match
+    return [isinstance(value, str) and match(value) is not None for value in values]
+
+print(clean_texts(["Hi!", None]), clean_texts(pd.Series(["Hi!", None])).tolist())  # Output: ['Hi', None] ['Hi', nan]
+print(validate_series('email', ["user@example.com", None]))  # Output: [True, False]
+
+# ### Using several processes for regex-heavy rules
+
+# Regex rules run in Python's regex engine, one row at a time, on a single CPU core.
+# For heavy rules we can split the rows into chunks and process them in parallel.
+
+def apply_to_chunk(func, chunk):
+    return func(chunk)
+
+# `func` takes a list of strings and returns a list; it must be defined at module level so it can be sent to the workers
+def map_in_processes(func, values, processes=None, chunk_size=200_000):
+    items = values.tolist() if isinstance(values, pd.Series) else list(values)
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        results = list(itertools.chain.from_iterable(pool.map(apply_to_chunk, itertools.repeat(func), chunks)))
+    if isinstance(values, pd.Series):
+        return pd.Series(results, index=values.index)
+    return results
+
+# Note: the pool only pays off with several CPU cores and a rule that is expensive per row.
+# For a cheap rule, sending the rows to the workers and back can cost more than the work itself.
+
+# ### Benchmark
+
+N_ROWS = 10_000_000  # Needs a few GB of memory; lower it on a small machine
+
+def timed_run(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:45} {time.perf_counter() - start:.2f} s")
+    return result
+
+# The rows are built under the guard too, so the pool's worker processes do not build them again
+if __name__ == '__main__':
+    rows = pd.Series([dirty_text, date_text, "Contact: user@example.com, (123) 456-7890!", "Ünïcödé — text…"] * (N_ROWS // 4))
+    rows_list = rows.tolist()
+
+    expected = timed_run("clean: re.sub per row", lambda: [re.sub(r'[^\w\s]', '', text) for text in rows_list])
+    assert timed_run("clean: str.translate over the list", lambda: clean_texts(rows_list)) == expected
+    assert timed_run("clean: Series.str.translate", lambda: clean_texts(rows)).tolist() == expected
+
+    expected = timed_run("dates: re.findall per row", lambda: [re.findall(date_pattern, text) for text in rows_list])
+    assert timed_run("dates: Series.str.findall", lambda: extract_dates_many(rows)).tolist() == expected
+    assert timed_run("dates: process pool", lambda: map_in_processes(extract_dates_many, rows_list)) == expected
+
+    expected = timed_run("emails: validate_email per row", lambda: [validate_email(text) for text in rows_list])
+    assert timed_run("emails: Series.str.match", lambda: validate_series('email', rows)).tolist() == expected
+
+# ## 8. Running Regular Expressions Safely on Untrusted Input
+
+# Python's regex engine uses backtracking: when a match fails, it goes back and tries other ways to split the text.
+# With some patterns, the number of ways grows exponentially with the length of the input. A classic example is
+# a **nested quantifier** such as `(\w+\s?)*$`: on a string of 30 letters followed by `!`, the engine tries
+# millions of combinations before giving up. An attacker can use this to freeze a web server with one form
+# submission; this is called ReDoS (Regular expression Denial of Service).
+
+# Another source of exponential backtracking is an **alternation whose alternatives overlap** inside a repeat,
+# such as `(a|a)*$` or `(a|aa)*$`: every `a` can be matched in two ways, so a failing input of n letters
+# has about 2^n ways to be split.
+
+# We protect ourselves in three steps:
+# 1. Analyse every registered pattern and report nested quantifiers and overlapping alternatives
+# 2. Run risky patterns in a separate worker process with a time budget, killing it if it takes too long
+#    (or use the `re2` module, a linear-time engine, when it is installed and gives the same results)
+# 3. Fuzz the patterns with many inputs and report the worst time per pattern
+
+# ### Step 1: Static analysis of the pattern
+
+# `re` parses a pattern into a tree before compiling it; we walk that tree to find quantifiers inside quantifiers,
+# and alternatives that can start with the same character inside an unbounded repeat.
+# A bounded repeat with a large maximum is just as dangerous: `(a?){25}a{25}$` tries about 2^25 ways to fail.
+
+import string
+
+try:
+    import re._parser as sre_parse  # Python 3.11+
+    import re._constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+
+REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT, getattr(sre_constants, 'POSSESSIVE_REPEAT', None))
+LARGE_REPEAT = 10  # A repeat allowing this many repetitions or more is treated like an unbounded one
+
+# The first characters an alternative can start with are computed on a sample alphabet
+# (ASCII plus a few non-ASCII letters, digits and spaces), which is enough to spot overlaps
+SAMPLE_ALPHABET = frozenset(string.printable + 'éÜß١٢٣  ')
+CATEGORY_REGEX = {
+    sre_constants.CATEGORY_DIGIT: re.compile(r'\d'), sre_constants.CATEGORY_NOT_DIGIT: re.compile(r'\D'),
+    sre_constants.CATEGORY_WORD: re.compile(r'\w'), sre_constants.CATEGORY_NOT_WORD: re.compile(r'\W'),
+    sre_constants.CATEGORY_SPACE: re.compile(r'\s'), sre_constants.CATEGORY_NOT_SPACE: re.compile(r'\S'),
+}
+
+def in_class(items, char):
+    negate, hit = False, False
+    for op, av in items:
+        if op is sre_constants.NEGATE:
+            negate = True
+        elif op is sre_constants.LITERAL:
+            hit = hit or ord(char) == av
+        elif op is sre_constants.RANGE:
+            hit = hit or av[0] <= ord(char) <= av[1]
+        elif op is sre_constants.CATEGORY:
+            regex = CATEGORY_REGEX.get(av)
+            hit = hit or regex is None or regex.match(char) is not None
+        else:
+            hit = True  # Unknown item: assume it matches
+    return hit != negate
+
+# Return (characters the sequence can start with, whether it can match the empty string)
+def first_chars(items):
+    chars = set()
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            item_chars, nullable = {chr(av).lower(), chr(av).upper()}, False  # Both cases, in case of IGNORECASE
+        elif op is sre_constants.NOT_LITERAL:
+            item_chars, nullable = SAMPLE_ALPHABET - {chr(av)}, False
+        elif op is sre_constants.IN:
+            item_chars, nullable = {c for c in SAMPLE_ALPHABET if in_class(av, c)}, False
+        elif op is sre_constants.ANY:
+            item_chars, nullable = set(SAMPLE_ALPHABET), False
+        elif op is sre_constants.SUBPATTERN:
+            item_chars, nullable = first_chars(av[3])
+        elif op in REPEATS:
+            item_chars, nullable = first_chars(av[2])
+            nullable = nullable or av[0] == 0
+        elif op is sre_constants.BRANCH:
+            results = [first_chars(branch) for branch in av[1]]
+            item_chars = set().union(*(c for c, _ in results))
+            nullable = any(n for _, n in results)
+        elif op is getattr(sre_constants, 'ATOMIC_GROUP', None):
+            item_chars, nullable = first_chars(av)
+        elif op in (sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            item_chars, nullable = set(), True  # Zero-width
+        else:
+            item_chars, nullable = set(SAMPLE_ALPHABET), True  # Back-references and others: be conservative
+        chars |= item_chars
+        if not nullable:
+            return chars, False
+    return chars, True
+
+def overlapping_alternatives(branches, follow):
+    starts = []
+    for branch in branches:
+        chars, nullable = first_chars(branch)
+        # An alternative that can be empty "starts" with whatever comes after the alternation
+        starts.append((chars | follow if nullable else chars, nullable))
+    for i, (chars_i, nullable_i) in enumerate(starts):
+        for chars_j, nullable_j in starts[i + 1:]:
+            if (nullable_i and nullable_j) or chars_i & chars_j:
+                return True
+    return False
+
+# `follow` holds the characters that can come right after `items` (needed for alternatives that can be empty).
+# `outer` describes the enclosing unbounded or large repeat, if any.
+def find_hazards(items, outer=None, hazards=None, follow=frozenset()):
+    hazards = [] if hazards is None else hazards
+    for index, (op, av) in enumerate(items):
+        rest_chars, rest_nullable = first_chars(items[index + 1:])
+        after = rest_chars | follow if rest_nullable else rest_chars
+        if op in REPEATS:
+            low, high, body = av
+            unbounded = high == sre_constants.MAXREPEAT
+            if outer and high != low:
+                hazards.append(f"nested quantifier {{{low},{'inf' if unbounded else high}}} inside {outer}")
+            # After one repetition the body can start again, or the pattern continues
+            body_follow = first_chars(body)[0] | after if high != low else after
+            body_outer = outer
+            if not outer and unbounded:
+                body_outer = "an unbounded repeat"
+            elif not outer and high >= LARGE_REPEAT:
+                body_outer = f"a large repeat {{{low},{high}}}"
+            find_hazards(body, body_outer, hazards, body_follow)
+        elif op is sre_constants.SUBPATTERN:
+            find_hazards(av[3], outer, hazards, after)
+        elif op is sre_constants.BRANCH:
+            if outer and overlapping_alternatives(av[1], after):
+                hazards.append(f"overlapping alternatives inside {outer}")
+            for branch in av[1]:
+                find_hazards(branch, outer, hazards, after)
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            find_hazards(av[1], outer, hazards)
+        elif op is sre_constants.GROUPREF_EXISTS:
+            for branch in av[1:]:
+                if branch is not None:
+                    find_hazards(branch, outer, hazards, after)
+        # Atomic groups never backtrack, so their contents are safe
+    return hazards
+
+def analyze_pattern(pattern):
+    return find_hazards(sre_parse.parse(pattern))
+
+print(analyze_pattern(r'^[\w.-]+@[\w.-]+\.\w{2,4}$'))  # Output: []
+print(analyze_pattern(r'^(\w+\s?)*$'))  # Output: ['nested quantifier {1,inf} inside an unbounded repeat', ...]
+print(analyze_pattern(r'^(a|a)*$'))  # Output: ['overlapping alternatives inside an unbounded repeat']
+print(analyze_pattern(r'^(ab|cd)*$'))  # Output: []
+print(analyze_pattern(r'^(a?){25}a{25}$'))  # Output: ['nested quantifier {0,1} inside a large repeat {25,25}']
+
+# ### Step 2: Matching with a time budget
+
+# A running regex cannot be interrupted from another thread, but a process can be terminated.
+# The guard keeps one worker process alive and sends it the risky matches through a `Pipe`.
+# If the answer does not arrive in time, the worker is killed (and restarted on the next call).
+
+import multiprocessing
+import threading
+
+try:
+    import re2  # Linear-time engine: pip install google-re2
+except ImportError:
+    re2 = None
+
+class RegexTimeout(TimeoutError):
+    pass
+
+# Runs in the worker process: match and report how long it took
+def regex_worker(connection):
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        pattern, flags, text = request
+        regex = re.compile(pattern, flags)  # Cached by `re` after the first call, so it is not timed
+        start = time.perf_counter()
+        match = regex.match(text)
+        connection.send((match.span() if match else None, time.perf_counter() - start))
+
+# re2 is not a drop-in replacement: its `\w`, `\d` and `\s` only match ASCII characters, `$` does not match
+# before a final newline, and some syntax is missing. We only use it for a pattern when it gives the same spans
+# as `re` on these short samples (short, so that even a dangerous pattern checks them quickly).
+# re2 is also only used on input where both engines agree: for patterns with `$`, text without a final newline,
+# and for patterns with escapes such as `\w` or `\s`, ASCII text without the whitespace characters only Python
+# counts as `\s`.
+RE2_SAMPLES = ['', 'a', 'abc', 'a b', 'user@example.com', '2024-09-10', '(123) 456-7890', '123', 'a\n', 'a\x0b',
+               'é', 'Ünïcödé', '١٢٣', 'a\u00a0b', '!!', 'a.b-c_d']
+RE2_FLAGS = {re.IGNORECASE: 'i', re.MULTILINE: 'm', re.DOTALL: 's'}
+PYTHON_ONLY_SPACES = set('\x0b\x1c\x1d\x1e\x1f')
+
+def re2_safe_text(pattern, text):
+    if '$' in pattern and text.endswith('\n'):
+        return False
+    return '\\' not in pattern or (text.isascii() and PYTHON_ONLY_SPACES.isdisjoint(text))
+
+def compile_re2(regex):
+    if re2 is None or regex.flags & (re.VERBOSE | re.LOCALE):
+        return None
+    inline = ''.join(letter for flag, letter in RE2_FLAGS.items() if regex.flags & flag)
+    try:
+        compiled = re2.compile(f"(?{inline}){regex.pattern}" if inline else regex.pattern)
+    except re2.error:
+        return None  # Not supported by re2 (e.g. backreferences, look-arounds)
+    for text in RE2_SAMPLES + [c * 3 for c in sorted(set(regex.pattern))]:
+        if not re2_safe_text(regex.pattern, text):
+            continue  # `match` never uses re2 on this text
+        expected, got = regex.match(text), compiled.match(text)
+        if (expected and expected.span()) != (got and got.span()):
+            return None
+    return compiled
+
+class RegexGuard:
+    def __init__(self, registry, timeout=0.1, isolate_all=False):
+        self.registry = registry
+        self.timeout = timeout
+        self.isolate_all = isolate_all  # Also isolate patterns the analysis considers safe
+        self.hazards = {}
+        self.re2_patterns = {}  # name -> compiled re2 pattern, or None if re2 cannot be used
+        self.lock = threading.Lock()
+        self.connection = None
+        self.worker = None
+
+    def check(self, name):
+        if name not in self.hazards:
+            self.hazards[name] = analyze_pattern(self.registry[name].pattern)
+        return self.hazards[name]
+
+    # Return the span of the match at the start of `text`, or None
+    def match(self, name, text, timeout=None):
+        regex = self.registry[name]
+        if name not in self.re2_patterns:
+            self.re2_patterns[name] = compile_re2(regex)
+        compiled = self.re2_patterns[name]
+        if compiled is not None and re2_safe_text(regex.pattern, text):
+            match = compiled.match(text)
+            return match.span() if match else None
+        if not self.isolate_all and not self.check(name):
+            match = regex.match(text)
+            return match.span() if match else None
+        return self.run_isolated(regex, text, timeout or self.timeout)[0]
+
+    # Return (span, seconds) from the worker, or raise RegexTimeout
+    def run_isolated(self, regex, text, timeout):
+        with self.lock:
+            if self.worker is None:
+                self.connection, child_connection = multiprocessing.Pipe()
+                self.worker = multiprocessing.Process(target=regex_worker, args=(child_connection,), daemon=True)
+                self.worker.start()
+            self.connection.send((regex.pattern, regex.flags, text))
+            if self.connection.poll(timeout):
+                return self.connection.recv()
+            self.worker.kill()
+            self.worker.join()
+            self.worker = None
+            raise RegexTimeout(f"{regex.pattern!r} took more than {timeout} s on a {len(text)}-character input")
+
+    def close(self):
+        with self.lock:
+            if self.worker is not None:
+                self.connection.send(None)
+                self.worker.join()
+                self.worker = None
+
+patterns.register('words_line', r'^(\w+\s?)*$')  # Dangerous patterns, for the demonstration
+patterns.register('repeated_a', r'^(a|a)*$')
+guard = RegexGuard(patterns, timeout=0.5)
+
+if __name__ == '__main__':
+    print(guard.match('email', "user@example.com"))  # Output: (0, 16)
+    for name in ['words_line', 'repeated_a']:
+        try:
+            guard.match(name, "a" * 40 + "!")
+        except RegexTimeout as e:
+            print("Blocked:", e)
+
+# ### Step 3: Fuzzing for the worst case
+
+# For each pattern we try inputs that are known to trigger backtracking (a long run of one character
+# followed by a character that makes the match fail) and random strings built from characters the pattern uses.
+# Every input runs in the worker, so a catastrophic case only costs the time budget.
+
+import random
+
+def fuzz_inputs(pattern, lengths=(10, 20, 30, 100, 1_000, 10_000), random_count=200, seed=0):
+    rng = random.Random(seed)
+    alphabet = sorted(set(re.sub(r'\\[a-zA-Z]', '', pattern)) - set('^$()[]{}*+?|\\') | set('a0 .@-!'))
+    for length in lengths:
+        for char in alphabet:
+            yield char * length + '!'
+        yield 'a@' + 'a.' * (length // 2) + '!'
+        yield 'a ' * (length // 2) + '!'
+    for _ in range(random_count):
+        yield ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 200)))
+
+def fuzz_benchmark(guard, names, timeout=1.0):
+    print(f"{'pattern':12} {'worst time':>12} {'input length':>13}  hazards")
+    for name in names:
+        regex = guard.registry[name]
+        worst_time, worst_length = 0.0, 0
+        for text in fuzz_inputs(regex.pattern):
+            try:
+                _, seconds = guard.run_isolated(regex, text, timeout)
+            except RegexTimeout:
+                seconds = float('inf')
+            if seconds > worst_time:
+                worst_time, worst_length = seconds, len(text)
+            if seconds == float('inf'):
+                break  # No need to keep going: this pattern is vulnerable
+        shown = '> timeout' if worst_time == float('inf') else f"{worst_time * 1000:.2f} ms"
+        print(f"{name:12} {shown:>12} {worst_length:>13}  {guard.check(name) or 'none'}")
+
+if __name__ == '__main__':
+    fuzz_benchmark(guard, ['email', 'phone', 'date', 'words_line'])
+    guard.close()
@@ -270,3 +270,1002 @@ urlpatterns = [
 </body>
 </html>
 
+# # Deploying and Scaling Flask and Django Apps
+
+# The applications above are started with `app.run(debug=True)` and `python manage.py runserver`.
+# Both are development servers: they are great for learning, but they are not designed for real traffic.
+# In this part we look at how to serve the same views faster and more reliably.
+
+# ## 1. Async Views and ASGI
+
+# A classic (WSGI) view runs on a worker thread from the moment the request arrives until the response is sent.
+# If `submit` has to wait for another service or a database, that thread just sits there waiting.
+# An async view can `await` that I/O instead, so a single worker can handle many requests at the same time.
+# Async views are served by an ASGI server such as Uvicorn or Hypercorn instead of a WSGI server.
+
+# Note: Flask itself accepts `async def` views (`pip install "flask[async]"`), but it still runs each one
+# inside a worker thread. To really free the worker we use Quart, which has the same API as Flask but runs on ASGI.
+
+# ### Example: Async `submit` with Quart
+
+# !pip install quart uvicorn
+
+import asyncio
+
+from quart import Quart, render_template, request
+
+app = Quart(__name__)
+
+# Simulate a call to another service or database that takes 50 ms
+async def call_downstream(name):
+    await asyncio.sleep(0.05)
+    return f"Hello, {name}!"
+
+@app.route('/')
+async def home():
+    return await render_template('index.html')
+
+# The worker is free to serve other requests while `call_downstream` is waiting
+@app.route('/submit', methods=['POST'])
+async def submit():
+    form = await request.form  # Reading the body is also I/O, so it is awaited
+    name = form.get('name')
+    return await call_downstream(name)
+
+# Run the application with an ASGI server from the terminal:
+# uvicorn app:app --port 8001
+
+# ### Example: Async `submit` with Django
+
+# Django supports async views out of the box. In `myapp/views.py`:
+
+from django.http import HttpResponse
+from django.shortcuts import render
+
+async def submit(request):
+    if request.method == 'POST':
+        name = request.POST.get('name')
+        greeting = await call_downstream(name)
+        return HttpResponse(greeting)
+    return render(request, 'index.html')
+
+# `django-admin startproject` already created `myproject/asgi.py`, so the project can be served with:
+# uvicorn myproject.asgi:application --port 8001
+
+# Note: `runserver` also accepts async views, but it is a WSGI server, so each request still uses a thread.
+
+# ### Comparing Sync and Async Workers
+
+# For a fair comparison, here is the same endpoint written as a classic sync Flask view (`app_sync.py`):
+
+import time
+
+from flask import Flask, request
+
+app = Flask(__name__)
+
+@app.route('/submit', methods=['POST'])
+def submit():
+    name = request.form.get('name')
+    time.sleep(0.05)  # The same 50 ms of downstream I/O, but the thread is blocked
+    return f"Hello, {name}!"
+
+# Serve it with 4 sync workers:
+# gunicorn -w 4 app_sync:app --bind 127.0.0.1:8000
+
+# The load generator below sends many POST requests at the same time and measures
+# the throughput (requests per second) and the p99 latency (99% of the requests were faster than this).
+
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+# Send a single form POST and return how long it took, in seconds
+def post_form(url, data):
+    body = urlencode(data).encode()
+    start = time.perf_counter()
+    with urlopen(Request(url, data=body, method='POST')) as response:
+        response.read()
+    return time.perf_counter() - start
+
+# Send `total_requests` POSTs using `concurrency` clients in parallel
+def load_test(url, total_requests=2000, concurrency=100):
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        latencies = list(pool.map(lambda _: post_form(url, {'name': 'Alice'}), range(total_requests)))
+        elapsed = time.perf_counter() - start
+    return {
+        'requests_per_second': round(total_requests / elapsed, 1),
+        'p99_ms': round(statistics.quantiles(latencies, n=100)[98] * 1000, 1),
+    }
+
+# Start both servers in a terminal first, then run the comparison
+servers = {
+    'sync (gunicorn, 4 workers)': 'http://127.0.0.1:8000/submit',
+    'async (uvicorn, 1 worker)': 'http://127.0.0.1:8001/submit',
+}
+for label, url in servers.items():
+    print(label, load_test(url))
+
+# With 100 concurrent clients, the 4 sync workers can only wait on 4 requests at a time,
+# so most requests sit in a queue and the p99 latency grows.
+# The single async worker waits on all 100 at once, giving much higher throughput and a p99 close to 50 ms.
+
+# ## 2. Running Flask with a Production Server
+
+# `app.run(debug=True)` starts a single process with the reloader and the debugger enabled.
+# In production we want a pre-fork server: a master process loads the app, then forks several worker
+# processes that all accept connections on the same port. Gunicorn is the most common choice for Flask.
+
+# Useful options:
+# - **workers**: number of worker processes (a common rule of thumb is `2 * CPU cores + 1`)
+# - **threads**: threads per worker, useful when views wait on I/O
+# - **keepalive**: seconds to keep an idle HTTP connection open, so clients can reuse it.
+#   Gunicorn's default `sync` worker does not support persistent connections and ignores this setting,
+#   so keep-alive needs the threaded `gthread` worker (even with a single thread per worker)
+# - **preload_app**: load the app in the master *before* forking, so workers share its memory (copy-on-write)
+
+# ### Example: A launcher for the Flask app
+
+# Create a file named `serve.py` next to `app.py`. It serves the same `app` object under Gunicorn,
+# so there is no need to call the `gunicorn` command by hand.
+
+# !pip install gunicorn
+
+import argparse
+import multiprocessing
+
+from gunicorn.app.base import BaseApplication
+
+from app import app
+
+# Gunicorn application that serves an existing WSGI app object with options given in Python
+class StandaloneApplication(BaseApplication):
+    def __init__(self, application, options=None):
+        self.application = application
+        self.options = options or {}
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+def serve(application, host='127.0.0.1', port=8000, workers=None, threads=1, keepalive=5, preload=True):
+    options = {
+        'bind': f'{host}:{port}',
+        'workers': workers or multiprocessing.cpu_count() * 2 + 1,
+        'threads': threads,
+        # The sync worker closes every connection after one request: keep-alive needs gthread
+        'worker_class': 'gthread' if threads > 1 or keepalive else 'sync',
+        'keepalive': keepalive,
+        'preload_app': preload,
+        'graceful_timeout': 30,  # Seconds a worker gets to finish its requests when stopping
+    }
+    StandaloneApplication(application, options).run()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the Flask app with Gunicorn")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--keepalive', type=int, default=5, help="0 disables keep-alive (sync worker)")
+    parser.add_argument('--no-preload', dest='preload', action='store_false')
+    args = parser.parse_args()
+    serve(app, args.host, args.port, args.workers, args.threads, args.keepalive, args.preload)
+
+# Start the server from the terminal:
+# python serve.py --workers 4 --threads 2
+
+# ### Graceful Reload
+
+# Send the `HUP` signal to the master process to reload without dropping requests:
+# kill -HUP <master pid>
+# The master starts new workers and lets the old ones finish their current requests before they exit.
+# Note: with `preload_app` the code is loaded in the master, so use `--no-preload` if the reload
+# should also pick up code changes.
+
+# ### Benchmark: Requests per Second as Workers Scale
+
+# This script starts the server with a growing number of workers and runs the `load_test` function
+# from the previous section against each one.
+
+import socket
+import subprocess
+import sys
+
+# Wait until the server accepts connections on the given port
+def wait_for_port(port, host='127.0.0.1', timeout=10):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"Server on port {port} did not start")
+
+for workers in [1, 2, 4, 8]:
+    server = subprocess.Popen([sys.executable, 'serve.py', '--workers', str(workers), '--port', '8000'])
+    try:
+        wait_for_port(8000)
+        result = load_test('http://127.0.0.1:8000/submit', total_requests=2000, concurrency=50)
+        print(f"{workers} workers: {result}")
+    finally:
+        server.terminate()  # SIGTERM makes Gunicorn shut down gracefully
+        server.wait()
+
+# ## 3. Profiling Requests in Production
+
+# To make an app faster we first need to know where the time goes: in the view itself,
+# in template rendering, or in the database. A WSGI middleware wraps the whole application,
+# so it can measure every request without changing the views.
+
+# This middleware:
+# - records a latency histogram per route, plus the time spent rendering templates and running queries
+# - profiles a small random sample of requests with a sampling profiler and writes "folded stacks"
+#   (one line per call stack with a count), the input format of flame graph tools such as `flamegraph.pl` or speedscope
+# - serves all histograms at `/metrics` in the Prometheus text format
+# Recording a histogram costs about a microsecond, and profiling only runs on sampled requests,
+# so the middleware can be left on in production.
+
+# ### Example: A profiling middleware
+
+import bisect
+import os
+import random
+import sqlite3
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+# Upper bounds (in seconds) of the histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+METRIC_NAMES = {
+    'request': 'http_request_duration_seconds',
+    'template': 'template_render_duration_seconds',
+    'db': 'db_query_duration_seconds',
+}
+
+# Timings of the request currently handled by this thread
+_request_timings = threading.local()
+
+# Add the time spent in the `with` block to the current request under `kind` ('template' or 'db')
+@contextmanager
+def timed(kind):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = getattr(_request_timings, 'current', None)
+        if timings is not None:
+            timings[kind] += time.perf_counter() - start
+
+class Histogram:
+    def __init__(self):
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)  # The last bucket is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.bucket_counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+# Samples the call stack of one thread at a fixed interval while a request runs
+class StackSampler:
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+# The framework stores the matched URL rule (e.g. '/users/<int:user_id>') under this environ key.
+# Labelling by rule instead of by raw path keeps one histogram per route, not one per URL.
+ROUTE_KEY = 'profiling.route'
+UNMATCHED_ROUTE = '<unmatched>'
+
+# Prometheus label values must escape backslashes, double quotes and newlines
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class ProfilingMiddleware:
+    def __init__(self, app, sample_rate=0.01, profile_dir='profiles', metrics_path='/metrics'):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.profile_dir = profile_dir
+        self.metrics_path = metrics_path
+        self.histograms = {}  # (kind, route) -> Histogram
+        self.lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO') == self.metrics_path:
+            body = self.render_metrics().encode()
+            start_response('200 OK', [('Content-Type', 'text/plain; version=0.0.4'),
+                                      ('Content-Length', str(len(body)))])
+            return [body]
+        return self._profile_request(environ, start_response)
+
+    # A generator, so the measurement also covers streamed response bodies
+    def _profile_request(self, environ, start_response):
+        timings = {'template': 0.0, 'db': 0.0}
+        _request_timings.current = timings
+        sampler = StackSampler(threading.get_ident()) if random.random() < self.sample_rate else None
+        start = time.perf_counter()
+        body = None
+        try:
+            # Inside the `try`: if the app raises, the sampler is still stopped and the latency recorded
+            body = self.app(environ, start_response)
+            yield from body
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+            elapsed = time.perf_counter() - start
+            _request_timings.current = None
+            route = environ.get(ROUTE_KEY, UNMATCHED_ROUTE)
+            if sampler:
+                sampler.stop()
+                self.write_profile(route, sampler.stacks)
+            self.record(route, elapsed, timings)
+
+    def record(self, route, elapsed, timings):
+        with self.lock:
+            for kind, seconds in (('request', elapsed), ('template', timings['template']), ('db', timings['db'])):
+                if kind == 'request' or seconds:
+                    self.histograms.setdefault((kind, route), Histogram()).observe(seconds)
+
+    # Append the sampled stacks to profiles/<route>.folded
+    def write_profile(self, route, stacks):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        file_name = ''.join(c if c.isalnum() else '_' for c in route.strip('/')) or 'root'
+        with open(os.path.join(self.profile_dir, f"{file_name}.folded"), 'a') as file:
+            for stack, count in stacks.items():
+                file.write(f"{stack} {count}\n")
+
+    def render_metrics(self):
+        with self.lock:
+            items = sorted(self.histograms.items())
+            lines = []
+            for kind, name in METRIC_NAMES.items():
+                lines.append(f"# TYPE {name} histogram")
+                for (hist_kind, route), hist in items:
+                    if hist_kind != kind:
+                        continue
+                    route = escape_label(route)
+                    cumulative = 0
+                    for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), hist.bucket_counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{route="{route}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_sum{{route="{route}"}} {hist.total}')
+                    lines.append(f'{name}_count{{route="{route}"}} {hist.count}')
+        return '\n'.join(lines) + '\n'
+
+# A cursor that reports the time of every query to the current request.
+# sqlite only runs a SELECT as far as the first row in `execute`: the rest of the work happens while fetching,
+# so the fetch methods (and iteration) are timed too.
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, *args):
+        with timed('db'):
+            return super().execute(*args)
+
+    def executemany(self, *args):
+        with timed('db'):
+            return super().executemany(*args)
+
+    def fetchone(self):
+        with timed('db'):
+            return super().fetchone()
+
+    def fetchmany(self, *args):
+        with timed('db'):
+            return super().fetchmany(*args)
+
+    def fetchall(self):
+        with timed('db'):
+            return super().fetchall()
+
+    def __next__(self):
+        with timed('db'):
+            return super().__next__()
+
+# ### Using the middleware with Flask
+
+# Flask sends a signal before and after each template is rendered, which we use to time `render_template`.
+
+from flask import Flask, before_render_template, render_template, request, template_rendered
+
+app = Flask(__name__)
+app.wsgi_app = ProfilingMiddleware(app.wsgi_app, sample_rate=0.01)
+
+def template_started(sender, **extra):
+    _request_timings.template_start = time.perf_counter()
+
+def template_finished(sender, **extra):
+    timings = getattr(_request_timings, 'current', None)
+    if timings is not None:
+        timings['template'] += time.perf_counter() - _request_timings.template_start
+
+before_render_template.connect(template_started, app)
+template_rendered.connect(template_finished, app)
+
+# Label the request with the matched rule, e.g. '/users/<int:user_id>' rather than '/users/42'
+@app.before_request
+def store_route():
+    request.environ[ROUTE_KEY] = request.url_rule.rule if request.url_rule else UNMATCHED_ROUTE
+
+# Queries made with a `TimedCursor` are counted as DB time
+@app.route('/users')
+def users():
+    connection = sqlite3.connect('example.db')
+    cursor = connection.cursor(TimedCursor)
+    cursor.execute('SELECT name, age FROM users')
+    rows = cursor.fetchall()
+    connection.close()
+    return render_template('users.html', users=rows)
+
+# Now `http://127.0.0.1:5000/metrics` shows the histograms, and `profiles/users.folded` can be turned into a flame graph:
+# flamegraph.pl profiles/users.folded > users.svg
+
+# ### Using the middleware with Django
+
+# Wrap the WSGI application in `myproject/wsgi.py`:
+
+from django.core.wsgi import get_wsgi_application
+
+application = ProfilingMiddleware(get_wsgi_application(), sample_rate=0.01)
+
+# Django lets us wrap every SQL query with `connection.execute_wrapper`.
+# Add this Django middleware (in `myapp/middleware.py`) to the `MIDDLEWARE` setting to record DB time:
+
+from django.db import connection
+
+def time_query(execute, sql, params, many, context):
+    with timed('db'):
+        return execute(sql, params, many, context)
+
+class QueryTimingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with connection.execute_wrapper(time_query):
+            response = self.get_response(request)
+        # request.META is the WSGI environ: label the request with the matched URL pattern
+        match = request.resolver_match
+        request.META[ROUTE_KEY] = match.route if match is not None and match.route else UNMATCHED_ROUTE
+        return response
+
+# For template time, wrap the render call in a view, for example in `home`:
+# with timed('template'):
+#     response = render(request, 'form.html', {'form': form})
+
+# ### Measuring the overhead
+
+# Flask's test client calls the app directly, without a network, so it shows the cost of the middleware itself.
+
+def requests_per_second(flask_app, path='/users', total_requests=2000):
+    client = flask_app.test_client()
+    start = time.perf_counter()
+    for _ in range(total_requests):
+        client.get(path)
+    return total_requests / (time.perf_counter() - start)
+
+plain_app = Flask(__name__)
+plain_app.add_url_rule('/users', view_func=lambda: 'ok')
+profiled_app = Flask(__name__)
+profiled_app.add_url_rule('/users', view_func=lambda: 'ok')
+profiled_app.wsgi_app = ProfilingMiddleware(profiled_app.wsgi_app, sample_rate=0.01)
+profiled_app.before_request(store_route)
+
+print(f"Without middleware: {requests_per_second(plain_app):.0f} requests/s")
+print(f"With middleware:    {requests_per_second(profiled_app):.0f} requests/s")
+
+# ## 4. Faster Form Validation
+
+# Every POST to the Django `home` view runs `UserForm(request.POST)` and `form.is_valid()`.
+# Creating a form instance deep-copies all the field and widget objects of the form class,
+# and validation then builds a `BoundField` for each field. For a small form, that setup costs more than the validation itself.
+
+# The field objects defined on the class (`UserForm.base_fields`) already know how to clean a value,
+# and Django's validators compile their regular expressions once, when the class is defined.
+# So we can build a validator from the form class once and reuse those objects for every request.
+
+# ### Example: Compiling a validator from `UserForm`
+
+# Create a file named `fast_forms.py` in your Django app directory (`myapp/fast_forms.py`).
+
+from django import forms
+from django.core.exceptions import ValidationError
+
+# Build a function `validate(data)` that returns `(cleaned_data, errors)` exactly like
+# `form.cleaned_data` and `form.errors` after `form.is_valid()`, without creating a form instance
+# These methods can change the fields or the validation at runtime.
+# If a form overrides any of them, only a real form instance gives the same result.
+FORM_HOOKS = ('__init__', 'full_clean', '_clean_fields', '_clean_form', '_post_clean', 'clean')
+
+def compile_form(form_class):
+    has_custom_hooks = any(getattr(form_class, hook) is not getattr(forms.Form, hook) for hook in FORM_HOOKS) or any(
+        attr.startswith('clean_') for attr in dir(form_class)
+    )
+    special_fields = any(
+        field.disabled or isinstance(field, forms.FileField) for field in form_class.base_fields.values()
+    )
+    if has_custom_hooks or special_fields:
+        # Custom hooks need a real form instance, so use the normal path
+        def validate(data):
+            form = form_class(data)
+            form.is_valid()
+            return form.cleaned_data, {name: list(messages) for name, messages in form.errors.items()}
+        return validate
+
+    # Look up everything we need once, instead of on every request.
+    # The data key is the prefixed name, like `form.add_prefix(name)`: 'p-name' for a form with prefix = 'p'
+    prefix = form_class.prefix
+    steps = [
+        (name, f"{prefix}-{name}" if prefix else name, field.widget.value_from_datadict, field.clean)
+        for name, field in form_class.base_fields.items()
+    ]
+
+    def validate(data):
+        cleaned_data = {}
+        errors = {}
+        for name, key, value_from_datadict, clean in steps:
+            try:
+                cleaned_data[name] = clean(value_from_datadict(data, {}, key))
+            except ValidationError as e:
+                errors[name] = e.messages
+        return cleaned_data, errors
+
+    return validate
+
+# In `myapp/views.py`, validate the POST data with the compiled function:
+
+from .forms import UserForm
+from .fast_forms import compile_form
+
+validate_user = compile_form(UserForm)  # Compiled once, when the module is imported
+
+def home(request):
+    if request.method == 'POST':
+        cleaned_data, errors = validate_user(request.POST)
+        if not errors:
+            return HttpResponse(f"Name: {cleaned_data['name']}, Email: {cleaned_data['email']}")
+        form = UserForm(request.POST)  # Only invalid submissions pay for a full form, to show the errors
+    else:
+        form = UserForm()
+
+    return render(request, 'form.html', {'form': form})
+
+# ### Microbenchmark
+
+# To run this outside a Django project, configure Django with the default settings first.
+
+import timeit
+
+import django
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure()
+    django.setup()
+
+class UserForm(forms.Form):
+    name = forms.CharField(label='Name', max_length=100)
+    email = forms.EmailField(label='Email')
+
+validate_user = compile_form(UserForm)
+
+def validate_with_form(data):
+    form = UserForm(data)
+    form.is_valid()
+    return form.cleaned_data, {name: list(messages) for name, messages in form.errors.items()}
+
+samples = [
+    {'name': 'Alice', 'email': 'alice@example.com'},
+    {'name': '  Bob  ', 'email': 'BOB@Example.COM'},
+    {'name': 'x' * 101, 'email': 'not-an-email'},
+    {'name': '', 'email': ''},
+    {},
+]
+
+# Both paths must give exactly the same result
+for data in samples:
+    assert validate_user(data) == validate_with_form(data), data
+
+for data in samples[:3]:
+    form_time = timeit.timeit(lambda: validate_with_form(data), number=10000)
+    fast_time = timeit.timeit(lambda: validate_user(data), number=10000)
+    print(f"{str(data)[:50]:52} form: {form_time:.3f}s  compiled: {fast_time:.3f}s  ({form_time / fast_time:.1f}x faster)")
+
+# ## 5. Streaming Large Pages
+
+# Our views build the whole response as one string before sending it.
+# For a page that lists every user in the database, that means all rows are loaded and the whole HTML
+# is rendered in memory before the browser receives the first byte.
+
+# Streaming sends the page in pieces while it is being generated:
+# - the rows are read from SQLite in small batches with `cursor.fetchmany`
+# - the template is rendered as a generator, chunk by chunk
+# - each chunk is sent to the client as soon as it is ready
+# The first byte goes out right away, and memory use stays the same no matter how many users there are.
+
+# ### Example: Streaming with Flask
+
+from contextlib import closing
+
+from flask import Flask, Response, stream_template, stream_with_context
+
+app = Flask(__name__)
+
+# The database file read by the views (the one created in DDBB.py)
+USERS_DB = 'example.db'
+
+# Yield rows one by one, but read them from the database in batches
+def iter_rows(cursor, batch_size=500):
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield from rows
+
+# Templates produce many tiny strings; join them into chunks of about `size` characters
+def buffered(chunks, size=8192):
+    buffer = []
+    length = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer)
+
+@app.route('/users')
+def users():
+    def generate():
+        with closing(sqlite3.connect(USERS_DB)) as connection:
+            cursor = connection.execute('SELECT name, age FROM users ORDER BY id')
+            yield from buffered(stream_template('users.html', users=iter_rows(cursor)))
+
+    # `stream_with_context` keeps the request available while the generator runs
+    return Response(stream_with_context(generate()), mimetype='text/html')
+
+# users.html
+
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>Users</title>
+</head>
+<body>
+    <h1>Users</h1>
+    <table>
+        {% for name, age in users %}
+        <tr><td>{{ name }}</td><td>{{ age }}</td></tr>
+        {% endfor %}
+    </table>
+</body>
+</html>
+
+# ### Example: Streaming with Django
+
+# Django templates cannot be rendered as a generator, so we render the page in three parts:
+# the header, one small template per batch of rows, and the footer.
+# In `myapp/views.py`:
+
+from django.http import StreamingHttpResponse
+from django.template import loader
+from django.template.loader import render_to_string
+
+def users(request):
+    rows_template = loader.get_template('user_rows.html')
+
+    def generate():
+        yield render_to_string('users_header.html', request=request)
+        with closing(sqlite3.connect(USERS_DB)) as connection:
+            cursor = connection.execute('SELECT name, age FROM users ORDER BY id')
+            while True:
+                rows = cursor.fetchmany(500)
+                if not rows:
+                    break
+                yield rows_template.render({'users': rows})
+        yield render_to_string('users_footer.html')
+
+    return StreamingHttpResponse(generate(), content_type='text/html')
+
+# Add the URL in `myapp/urls.py`:
+# path('users/', views.users, name='users'),
+
+# `users_header.html` and `users_footer.html` hold the first and last part of `users.html` above,
+# and `user_rows.html` holds only the loop:
+
+{% for name, age in users %}
+<tr><td>{{ name }}</td><td>{{ age }}</td></tr>
+{% endfor %}
+
+# ### Measuring Time to First Byte and Memory
+
+# We fill a temporary database with 200,000 users and compare the streaming view with a view that renders everything at once.
+# Both views read `USERS_DB`, so we point it at the temporary file and leave `example.db` untouched.
+
+import shutil
+import tempfile
+import tracemalloc
+
+benchmark_dir = tempfile.mkdtemp()
+USERS_DB = os.path.join(benchmark_dir, 'users_benchmark.db')
+
+with closing(sqlite3.connect(USERS_DB)) as connection:
+    connection.execute('CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, age INTEGER)')
+    connection.executemany('INSERT INTO users (name, age) VALUES (?, ?)',
+                           ((f"User {i}", i % 90) for i in range(200_000)))
+    connection.commit()
+
+@app.route('/users-all')
+def users_all():
+    with closing(sqlite3.connect(USERS_DB)) as connection:
+        rows = connection.execute('SELECT name, age FROM users ORDER BY id').fetchall()
+    return render_template('users.html', users=rows)
+
+def measure(path):
+    client = app.test_client()
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get(path, buffered=False)
+    chunks = iter(response.response)
+    next(chunks)
+    first_byte = time.perf_counter() - start
+    for _ in chunks:
+        pass
+    total = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    response.close()
+    print(f"{path:12} first byte: {first_byte * 1000:7.1f} ms  total: {total:.2f} s  peak memory: {peak / 1e6:.1f} MB")
+
+measure('/users-all')
+measure('/users')
+
+shutil.rmtree(benchmark_dir)
+USERS_DB = 'example.db'
+
+# ## 6. Rate Limiting and Request Coalescing
+
+# When a user double-clicks "Submit", or a script sends the same form many times, every POST to `/submit` does the full work.
+# A middleware in front of the app can protect it in two ways:
+# - **Rate limiting** with a token bucket: each client gets a bucket that refills at `rate` tokens per second,
+#   up to `burst` tokens. Every request takes a token; when the bucket is empty the client gets `429 Too Many Requests`.
+# - **Request coalescing** ("single-flight"): if an identical request from the same client is already being processed,
+#   the new one waits for it and receives the same response, instead of doing the work a second time.
+#   Requests are only coalesced within one client (same address, `Authorization` header and cookies):
+#   a response meant for one user must never be sent to another one.
+
+# ### Example: Token buckets
+
+# Token buckets kept in a dictionary, shared by all threads of one process.
+# A bucket that has refilled completely is the same as a new one, so it is dropped: otherwise the dictionary
+# would keep one entry for every client ever seen.
+class TokenBucketStore:
+    def __init__(self, sweep_interval=60):
+        self.buckets = {}  # key -> (tokens, last update time, time when the bucket is full again)
+        self.lock = threading.Lock()
+        self.sweep_interval = sweep_interval
+        self.next_sweep = time.monotonic() + sweep_interval
+
+    # Take one token from the bucket `key`; return False if it is empty
+    def take(self, key, rate, burst):
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated, _ = self.buckets.get(key, (burst, now, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            if now >= self.next_sweep:
+                self.buckets = {key: bucket for key, bucket in self.buckets.items() if bucket[2] > now}
+                self.next_sweep = now + self.sweep_interval
+            return allowed
+
+# With several Gunicorn workers, each process would have its own buckets.
+# To share them, keep the buckets in Redis (or any Redis-compatible server running locally).
+# The update runs as a Lua script, so it is atomic even when many workers use the same bucket.
+
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens') or burst)
+local updated = tonumber(redis.call('HGET', KEYS[1], 'updated') or now)
+tokens = math.min(burst, tokens + (now - updated) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return allowed
+"""
+
+# !pip install redis
+
+class RedisTokenBucketStore:
+    def __init__(self, client):
+        self.script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def take(self, key, rate, burst):
+        return self.script(keys=[key], args=[rate, burst, time.time()]) == 1
+
+# ### Example: Single-flight
+
+# Runs a function once per key, even if several threads ask for the same key at the same time
+class SingleFlight:
+    def __init__(self):
+        self.calls = {}  # key -> (done event, result holder)
+        self.lock = threading.Lock()
+
+    def do(self, key, func):
+        with self.lock:
+            call = self.calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self.calls[key] = (threading.Event(), {})
+        done, outcome = call
+        if not is_leader:
+            done.wait()  # Another thread is doing the work; wait for its result
+            if 'error' in outcome:
+                raise outcome['error']
+            return outcome['result']
+        try:
+            outcome['result'] = func()
+            return outcome['result']
+        except BaseException as e:  # Also KeyboardInterrupt or SystemExit: the waiters must not find an empty outcome
+            outcome['error'] = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            done.set()
+
+# ### Example: The middleware
+
+import hashlib
+import io
+
+class SubmitGuard:
+    def __init__(self, app, paths=('/submit',), rate=5, burst=10, store=None):
+        self.app = app
+        self.paths = set(paths)
+        self.rate = rate
+        self.burst = burst
+        self.store = store or TokenBucketStore()
+        self.single_flight = SingleFlight()
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO') not in self.paths or environ.get('REQUEST_METHOD') != 'POST':
+            return self.app(environ, start_response)
+
+        client = environ.get('REMOTE_ADDR', 'unknown')
+        if not self.store.take(f"rate:{client}", self.rate, self.burst):
+            start_response('429 Too Many Requests', [('Content-Type', 'text/plain'), ('Retry-After', '1')])
+            return [b'Too many requests, please slow down.\n']
+
+        body = self.read_body(environ)
+        # Two requests are identical if they come from the same client (address, credentials and cookies)
+        # and have the same URL and body
+        key = hashlib.sha256(b'\0'.join([
+            client.encode(),
+            environ.get('HTTP_AUTHORIZATION', '').encode(),
+            environ.get('HTTP_COOKIE', '').encode(),
+            environ['PATH_INFO'].encode(),
+            environ.get('QUERY_STRING', '').encode(),
+            body,
+        ])).hexdigest()
+
+        led = []
+        status, headers, content = self.single_flight.do(key, lambda: led.append(True) or self.call_app(environ, body))
+        if not led:
+            # A waiter gets the leader's response, but never its cookies (e.g. a new session)
+            headers = [(name, value) for name, value in headers if name.lower() != 'set-cookie']
+        start_response(status, headers)
+        return [content]
+
+    @staticmethod
+    def read_body(environ):
+        length = environ.get('CONTENT_LENGTH')
+        if length:
+            return environ['wsgi.input'].read(int(length))
+        # Without a length (chunked request), the body can only be read to the end
+        # if the server says the input stream is terminated
+        if environ.get('wsgi.input_terminated'):
+            return environ['wsgi.input'].read()
+        return b''
+
+    # Call the app and collect the whole response, so it can be shared with the waiting requests
+    def call_app(self, environ, body):
+        environ = dict(environ, **{'wsgi.input': io.BytesIO(body)})
+        response = {}
+
+        def capture(status, headers, exc_info=None):
+            response['status'] = status
+            response['headers'] = headers
+
+        result = self.app(environ, capture)
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response['status'], response['headers'], content
+
+# ### Using the middleware with Flask
+
+app = Flask(__name__)
+submit_calls = 0
+
+@app.route('/submit', methods=['POST'])
+def submit():
+    global submit_calls
+    submit_calls += 1
+    time.sleep(0.2)  # Simulate expensive work
+    name = request.form.get('name')
+    return f"Hello, {name}!"
+
+app.wsgi_app = SubmitGuard(app.wsgi_app, rate=5, burst=10)
+
+# With several workers, share the buckets through Redis:
+# import redis
+# app.wsgi_app = SubmitGuard(app.wsgi_app, store=RedisTokenBucketStore(redis.Redis()))
+
+# ### Load test with the Flask test client
+
+# Each thread gets its own test client. `environ_base` sets the client address seen by the middleware.
+def post_submit(client_address, name='Alice'):
+    client = app.test_client()
+    response = client.post('/submit', data={'name': name}, environ_base={'REMOTE_ADDR': client_address})
+    return response.status_code
+
+# 1. A client double-clicks: 10 identical POSTs at once from the same client, the view only runs once
+submit_calls = 0
+with ThreadPoolExecutor(max_workers=10) as pool:
+    statuses = list(pool.map(post_submit, ['10.0.0.1'] * 10))
+print(f"Coalescing: {statuses.count(200)} responses, view called {submit_calls} time(s)")
+# Output: Coalescing: 10 responses, view called 1 time(s)
+
+# The same POST from two different clients is not coalesced: each one gets its own response
+submit_calls = 0
+with ThreadPoolExecutor(max_workers=2) as pool:
+    statuses = list(pool.map(post_submit, ['10.0.0.2', '10.0.0.3']))
+print(f"Two clients: view called {submit_calls} time(s)")  # Output: Two clients: view called 2 time(s)
+
+# 2. One client sending 30 different POSTs at once: only `burst` of them are accepted
+with ThreadPoolExecutor(max_workers=30) as pool:
+    statuses = list(pool.map(lambda i: post_submit('10.0.1.1', f"User {i}"), range(30)))
+print(f"Rate limiting: {statuses.count(200)} accepted, {statuses.count(429)} rejected with 429")